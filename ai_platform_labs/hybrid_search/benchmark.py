@@ -0,0 +1,231 @@
+import argparse
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+from qdrant_client import models
+
+try:
+    from .chunking import Chunk
+    from .hybrid_search import RetrievalPlatform
+except ImportError:
+    # Executando como script (python benchmark.py)
+    from chunking import Chunk
+    from hybrid_search import RetrievalPlatform
+
+# Uso (offline, com os modelos já no cache local do HuggingFace):
+#   HF_HUB_OFFLINE=1 python benchmark.py --docs 100000 --queries 500
+#   python benchmark.py --corpus corpus.jsonl --qrels queries.jsonl --backend onnx
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "tu", "ve", "no", "si", "de", "xa", "po", "ri", "gu", "fe", "zo", "bi"]
+ATTRIBUTES = {
+    "owner": ["Alice", "Bruno", "Carla", "Diego", "Elisa", "Fabio", "Gabi", "Heitor"],
+    "deadline": ["January", "March", "May", "July", "September", "November"],
+    "database": ["Postgres", "MySQL", "MongoDB", "DynamoDB", "Cassandra", "Redis"],
+    "region": ["us-east-1", "eu-west-1", "sa-east-1", "ap-south-1"],
+    "status": ["on track", "delayed", "blocked", "shipped", "cancelled"],
+    "budget": ["10k dollars", "50k dollars", "120k dollars", "1M dollars"],
+}
+DOC_TEMPLATES = [
+    "The {attribute} of project {entity} is {value}.",
+    "For project {entity}, the {attribute} was set to {value} by the steering committee.",
+    "Project {entity} update: {attribute} is now {value}.",
+]
+QUERY_TEMPLATES = [
+    "What is the {attribute} of project {entity}?",
+    "project {entity} {attribute}",
+    "Tell me the {attribute} for {entity}",
+]
+FILLER = (
+    "The team reviewed the roadmap during the weekly sync. Several dependencies were discussed. "
+    "Action items were assigned and the notes were shared in the usual channel."
+)
+
+
+def _entity_name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(4)).capitalize()
+
+
+def synthetic_corpus(num_docs: int, num_queries: int, seed: int = 42) -> Tuple[Iterator[Chunk], List[Tuple[str, Set[str]]]]:
+    """
+    Corpus sintético com rótulos de relevância: cada documento afirma um atributo de
+    um projeto fictício, e cada query pergunta um (projeto, atributo) existente.
+    O corpus é um gerador, então 1M de documentos não precisa caber em memória.
+    """
+    rng = random.Random(seed)
+    attributes = list(ATTRIBUTES)
+    num_entities = max(1, num_docs // len(attributes))
+    entities = [f"{_entity_name(rng)}{i}" for i in range(num_entities)]
+
+    def doc_for(i: int) -> Tuple[str, str, str]:
+        entity = entities[i // len(attributes) % num_entities]
+        attribute = attributes[i % len(attributes)]
+        return entity, attribute, f"doc-{i}"
+
+    def documents() -> Iterator[Chunk]:
+        doc_rng = random.Random(seed + 1)
+        for i in range(num_docs):
+            entity, attribute, doc_id = doc_for(i)
+            text = doc_rng.choice(DOC_TEMPLATES).format(
+                entity=entity, attribute=attribute, value=doc_rng.choice(ATTRIBUTES[attribute])
+            )
+            if doc_rng.random() < 0.5:
+                text = f"{text} {FILLER}"
+            yield Chunk(text=text, parent_id=doc_id, chunk_index=0)
+
+    queries = []
+    for _ in range(num_queries):
+        i = rng.randrange(num_docs)
+        entity, attribute, doc_id = doc_for(i)
+        query = rng.choice(QUERY_TEMPLATES).format(entity=entity, attribute=attribute)
+        queries.append((query, {doc_id}))
+    return documents(), queries
+
+
+def load_corpus(corpus_path: str, qrels_path: str) -> Tuple[Iterator[Chunk], List[Tuple[str, Set[str]]]]:
+    # corpus.jsonl: {"id": ..., "text": ...}  |  queries.jsonl: {"query": ..., "relevant": [ids]}
+    def documents() -> Iterator[Chunk]:
+        with open(corpus_path) as f:
+            for line in f:
+                doc = json.loads(line)
+                yield Chunk(text=doc["text"], parent_id=str(doc["id"]), chunk_index=0)
+
+    with open(qrels_path) as f:
+        queries = [(q["query"], {str(r) for r in q["relevant"]}) for q in map(json.loads, f)]
+    return documents(), queries
+
+
+def recall_at_k(retrieved: List[str], relevant: Set[str], k: int) -> float:
+    return len(set(retrieved[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def ndcg_at_k(retrieved: List[str], relevant: Set[str], k: int) -> float:
+    dcg = sum(1 / math.log2(rank + 2) for rank, doc in enumerate(retrieved[:k]) if doc in relevant)
+    ideal = sum(1 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def mrr(retrieved: List[str], relevant: Set[str]) -> float:
+    for rank, doc in enumerate(retrieved):
+        if doc in relevant:
+            return 1 / (rank + 1)
+    return 0.0
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def time(self, stage: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[stage].append((time.perf_counter() - start) * 1000)
+        return result
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+            }
+            for stage, values in self.samples.items()
+        }
+
+
+def profile_query(platform: RetrievalPlatform, timer: StageTimer, query: str, collection: str,
+                  prefetch_limit: int, rerank_depth: int):
+    # Mesmas etapas do batch_hybrid_search, cronometradas uma a uma
+    client = platform.client
+    dense = timer.time("encode_dense", platform.dense_model.encode, [query])[0].tolist()
+    sparse = timer.time("encode_sparse", platform._get_sparse_vector, collection, query, is_query=True)
+
+    timer.time("dense_prefetch", client.query_points,
+               collection_name=collection, query=dense, using=None, limit=prefetch_limit)
+    timer.time("sparse_prefetch", client.query_points,
+               collection_name=collection, query=sparse, using="text-sparse", limit=prefetch_limit)
+
+    # A fusão RRF acontece dentro do Qdrant: esta etapa inclui os dois prefetch + RRF
+    fused = timer.time("fusion", client.query_points,
+                       collection_name=collection,
+                       prefetch=[
+                           models.Prefetch(query=dense, using=None, limit=prefetch_limit),
+                           models.Prefetch(query=sparse, using="text-sparse", limit=prefetch_limit),
+                       ],
+                       query=models.FusionQuery(fusion=models.Fusion.RRF),
+                       limit=rerank_depth).points
+
+    if fused:
+        timer.time("rerank", platform.reranker.predict, [(query, p.payload["text"]) for p in fused])
+
+
+def run(args):
+    if args.corpus:
+        documents, queries = load_corpus(args.corpus, args.qrels)
+    else:
+        documents, queries = synthetic_corpus(args.docs, args.queries, args.seed)
+
+    # cache_size=0: toda query paga o custo real (sem hits de cache)
+    platform = RetrievalPlatform(cache_size=0, backend=args.backend)
+    collection = "benchmark"
+    platform.create_collection(collection)
+
+    ingest_stats = platform.ingest(collection, documents, batch_size=args.batch_size)
+
+    timer = StageTimer()
+    quality = defaultdict(list)
+    for query, relevant in queries:
+        profile_query(platform, timer, query, collection, args.prefetch_limit, args.rerank_depth)
+
+        results = timer.time("end_to_end", platform.hybrid_search, query, collection,
+                             prefetch_limit=args.prefetch_limit, rerank_depth=args.rerank_depth, top_k=args.k)
+        retrieved = [point.payload.get("parent_id", str(point.id)) for point, _ in results]
+
+        quality[f"recall@{args.k}"].append(recall_at_k(retrieved, relevant, args.k))
+        quality[f"ndcg@{args.k}"].append(ndcg_at_k(retrieved, relevant, args.k))
+        quality["mrr"].append(mrr(retrieved, relevant))
+
+    report = {
+        "config": vars(args),
+        "ingest": ingest_stats,
+        "latency": timer.report(),
+        "quality": {metric: float(np.mean(values)) for metric, values in quality.items()},
+    }
+
+    print("\n--- Ingestão ---")
+    print(f"{ingest_stats['documents']} docs em {ingest_stats['seconds']:.1f}s ({ingest_stats['docs_per_sec']:.1f} docs/s)")
+    print("\n--- Latência por etapa (ms) ---")
+    for stage, stats in report["latency"].items():
+        print(f"{stage:>16} | p50 {stats['p50_ms']:8.2f} | p95 {stats['p95_ms']:8.2f} | p99 {stats['p99_ms']:8.2f}")
+    print("\n--- Qualidade ---")
+    for metric, value in report["quality"].items():
+        print(f"{metric}: {value:.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão, latência e qualidade do RetrievalPlatform")
+    parser.add_argument("--docs", type=int, default=10000, help="tamanho do corpus sintético")
+    parser.add_argument("--queries", type=int, default=200, help="número de queries sintéticas")
+    parser.add_argument("--corpus", help="corpus.jsonl próprio ({id, text}) em vez do sintético")
+    parser.add_argument("--qrels", help="queries.jsonl próprio ({query, relevant}) usado com --corpus")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--prefetch-limit", type=int, default=20)
+    parser.add_argument("--rerank-depth", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="salva o relatório completo em JSON")
+    args = parser.parse_args()
+
+    if args.corpus and not args.qrels:
+        parser.error("--corpus exige --qrels")
+    run(args)
@@ -0,0 +1,125 @@
+import multiprocessing as mp
+import resource
+import sys
+import time
+
+import numpy as np
+
+try:
+    from .onnx_backend import DEFAULT_ONNX_DIR, OnnxCrossEncoder, OnnxDenseEncoder
+except ImportError:
+    from onnx_backend import DEFAULT_ONNX_DIR, OnnxCrossEncoder, OnnxDenseEncoder
+
+QUERIES = [
+    "What is the refund policy?",
+    "When can the production server be restarted?",
+    "Which inference engine will we use to scale our models?",
+    "How do I cook pasta?",
+    "What is LangGraph used for?",
+    "Which Python version improved performance?",
+    "What are multi-agent systems?",
+    "How does Docker Compose work?",
+]
+
+PASSAGES = [
+    "Our startup's refund policy allows for returns within 30 days.",
+    "The production server must be restarted only on Sundays at 03:00.",
+    "The CTO has determined that we will use vLLM to scale our models.",
+    "The best way to cook pasta is to salt the water heavily, like the ocean.",
+    "LangGraph is a library for building stateful, multi-actor applications with LLMs.",
+    "Python 3.11 introduced significant performance improvements over previous versions.",
+    "Multi-agent systems consist of autonomous agents interacting to solve complex problems.",
+    "Docker Compose allows you to define and run multi-container Docker applications.",
+    "Artificial Intelligence in 2025 is focused on agentic workflows where LLMs can take actions.",
+    "Our office is closed on public holidays.",
+]
+
+
+def _load(backend: str, onnx_dir: str):
+    if backend == "onnx":
+        return (
+            OnnxDenseEncoder(f"{onnx_dir}/dense"),
+            OnnxCrossEncoder(f"{onnx_dir}/reranker"),
+        )
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+    return (
+        SentenceTransformer('all-MiniLM-L6-v2'),
+        CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2'),
+    )
+
+
+def _time_ms(fn, repeats: int):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 95)
+
+
+def run_backend(backend: str, onnx_dir: str, repeats: int, results):
+    # Cada backend roda no seu próprio processo para o RSS medir só os seus modelos
+    dense_model, reranker = _load(backend, onnx_dir)
+
+    pairs = [(q, p) for q in QUERIES for p in PASSAGES]
+    embeddings = dense_model.encode(QUERIES + PASSAGES)
+    scores = reranker.predict(pairs)
+
+    results.put({
+        "backend": backend,
+        "embeddings": np.asarray(embeddings),
+        "scores": np.asarray(scores),
+        "encode_query_ms": _time_ms(lambda: dense_model.encode([QUERIES[0]]), repeats),
+        "encode_batch_ms": _time_ms(lambda: dense_model.encode(PASSAGES), repeats),
+        # Mesmo formato do hybrid_search: 1 query x 10 candidatos
+        "rerank_10_ms": _time_ms(lambda: reranker.predict(pairs[:10]), repeats),
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def parity(torch_run, onnx_run):
+    a, b = torch_run["embeddings"], onnx_run["embeddings"]
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+    torch_scores = torch_run["scores"].reshape(len(QUERIES), len(PASSAGES))
+    onnx_scores = onnx_run["scores"].reshape(len(QUERIES), len(PASSAGES))
+    top1 = (torch_scores.argmax(axis=1) == onnx_scores.argmax(axis=1)).mean()
+    top5 = np.mean([
+        len(set(np.argsort(-t)[:5]) & set(np.argsort(-o)[:5])) / 5
+        for t, o in zip(torch_scores, onnx_scores)
+    ])
+    return {
+        "embedding_cosine_min": float(cosine.min()),
+        "embedding_cosine_mean": float(cosine.mean()),
+        "rerank_max_abs_diff": float(np.abs(torch_scores - onnx_scores).max()),
+        "rerank_top1_agreement": float(top1),
+        "rerank_top5_overlap": float(top5),
+    }
+
+
+if __name__ == "__main__":
+    onnx_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ONNX_DIR
+    repeats = 50
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    runs = {}
+    for backend in ("torch", "onnx"):
+        proc = ctx.Process(target=run_backend, args=(backend, onnx_dir, repeats, results))
+        proc.start()
+        run = results.get()
+        proc.join()
+        runs[run["backend"]] = run
+
+    print("\n--- Latência (p50 / p95 ms) e memória ---")
+    for backend, run in runs.items():
+        print(
+            f"{backend:>5} | encode 1 query: {run['encode_query_ms'][0]:.2f} / {run['encode_query_ms'][1]:.2f}"
+            f" | encode 10 docs: {run['encode_batch_ms'][0]:.2f} / {run['encode_batch_ms'][1]:.2f}"
+            f" | rerank 10 pares: {run['rerank_10_ms'][0]:.2f} / {run['rerank_10_ms'][1]:.2f}"
+            f" | RSS: {run['rss_mb']:.0f} MB"
+        )
+
+    print("\n--- Paridade ONNX int8 vs PyTorch ---")
+    for metric, value in parity(runs["torch"], runs["onnx"]).items():
+        print(f"{metric}: {value:.4f}")
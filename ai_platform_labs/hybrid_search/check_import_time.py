@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+# Uso:
+#   python check_import_time.py            # orçamento padrão
+#   python check_import_time.py 0.5        # orçamento em segundos
+# Sai com código 1 se o import estourar o orçamento ou puxar torch/sentence-transformers.
+
+MODULE = "ai_platform_labs.hybrid_search.hybrid_search"
+DEFAULT_BUDGET_SECONDS = 1.5
+# Só devem ser importados no primeiro encode/rerank (ver model_registry)
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "onnxruntime"]
+
+# Roda num interpretador novo: o tempo medido é o de um import "a frio" de verdade
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import {MODULE}
+from {MODULE} import RetrievalPlatform
+RetrievalPlatform()
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure() -> dict:
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=repo_root, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_SECONDS
+    result = measure()
+
+    print(f"import + RetrievalPlatform(): {result['seconds']:.3f}s (orçamento {budget:.3f}s)")
+    failures = []
+    if result["seconds"] > budget:
+        failures.append(f"estourou o orçamento em {result['seconds'] - budget:.3f}s")
+    if result["heavy"]:
+        failures.append(f"módulos pesados importados cedo demais: {', '.join(result['heavy'])}")
+
+    for failure in failures:
+        print(f"FALHOU: {failure}")
+    sys.exit(1 if failures else 0)
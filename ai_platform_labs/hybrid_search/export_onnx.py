@@ -0,0 +1,67 @@
+import os
+import sys
+
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+try:
+    from .onnx_backend import DEFAULT_ONNX_DIR
+except ImportError:
+    from onnx_backend import DEFAULT_ONNX_DIR
+
+# Mesmos modelos que o RetrievalPlatform carrega via PyTorch
+MODELS = {
+    "dense": ("sentence-transformers/all-MiniLM-L6-v2", AutoModel),
+    "reranker": ("cross-encoder/ms-marco-MiniLM-L-6-v2", AutoModelForSequenceClassification),
+}
+
+
+def export_model(name: str, output_dir: str):
+    model_id, model_cls = MODELS[name]
+    model_dir = os.path.join(output_dir, name)
+    os.makedirs(model_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = model_cls.from_pretrained(model_id).eval()
+
+    # Exemplo só para traçar o grafo; o shape real vem dos eixos dinâmicos abaixo
+    sample = tokenizer(["query de exemplo"], ["passagem de exemplo"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+
+    # DEFINIÇÃO CRUCIAL:
+    # batch e sequência dinâmicos, para o mesmo .onnx atender lotes de qualquer tamanho
+    dynamic_axes = {input_name: {0: "batch", 1: "sequence"} for input_name in input_names}
+    # dense devolve os embeddings por token (o pooling é feito no backend); reranker, os logits
+    dynamic_axes["output"] = {0: "batch", 1: "sequence"} if name == "dense" else {0: "batch"}
+
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[input_name] for input_name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+
+    # Quantização dinâmica int8: pesos em int8, ativações quantizadas em tempo de execução
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    # Tokenizer e config ficam junto do modelo (o backend ONNX não precisa do PyTorch)
+    tokenizer.save_pretrained(model_dir)
+    model.config.save_pretrained(model_dir)
+
+    fp32_mb = os.path.getsize(fp32_path) / 1024 / 1024
+    int8_mb = os.path.getsize(int8_path) / 1024 / 1024
+    print(f"{name}: {model_id} -> {int8_path} ({fp32_mb:.1f} MB fp32 -> {int8_mb:.1f} MB int8)")
+
+
+if __name__ == "__main__":
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ONNX_DIR
+    for name in MODELS:
+        export_model(name, output_dir)
+    print("Modelos ONNX quantizados exportados! Use RetrievalPlatform(backend='onnx').")
@@ -1,16 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from typing import List
-from fastbm25 import fastbm25
+try:
+    from .cache import TTLCache, normalize_query
+    from .chunking import Chunk, Chunker, collapse_chunks
+    from . import model_registry
+    from .sparse_encoder import BM25SparseEncoder
+except ImportError:
+    # Executando como script (python hybrid_search.py)
+    from cache import TTLCache, normalize_query
+    from chunking import Chunk, Chunker, collapse_chunks
+    import model_registry
+    from sparse_encoder import BM25SparseEncoder
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[List]:
+    # Consome qualquer iterável/gerador em blocos, sem materializar o corpus inteiro
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def doc_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def documents_hash(documents: Iterable[str]) -> str:
+    # Hash do conjunto (independe da ordem), usado para pular a reingestão no boot
+    return hashlib.sha256("".join(sorted(doc_hash(d) for d in documents)).encode()).hexdigest()
+
+
+# Metadados filtráveis: cada um ganha um índice de payload no Qdrant. O "tenant" é marcado
+# como tal, então o Qdrant agrupa os vetores de cada tenant em disco.
+INDEXED_FIELDS = {
+    "tenant": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+    "source": models.PayloadSchemaType.KEYWORD,
+    "timestamp": models.PayloadSchemaType.FLOAT,
+}
+RRF_K = 60
+
+
+def build_filter(filters: Optional[Dict[str, Any]]) -> Optional[models.Filter]:
+    # {"tenant": "acme", "source": ["wiki", "slack"], "timestamp": {"gte": 1735689600}}
+    # valor simples -> igualdade, lista -> qualquer um deles, dict -> intervalo (gt/gte/lt/lte)
+    if not filters:
+        return None
+    conditions = []
+    for field, value in sorted(filters.items()):
+        if isinstance(value, dict):
+            conditions.append(models.FieldCondition(key=field, range=models.Range(**value)))
+        elif isinstance(value, (list, tuple, set)):
+            conditions.append(models.FieldCondition(key=field, match=models.MatchAny(any=list(value))))
+        else:
+            conditions.append(models.FieldCondition(key=field, match=models.MatchValue(value=value)))
+    return models.Filter(must=conditions)
+
+
+def _filter_key(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+    return json.dumps(filters, sort_keys=True, default=sorted) if filters else None
+
+
+def _text(doc: Union[str, Chunk]) -> str:
+    return doc.text if isinstance(doc, Chunk) else doc
+
+
+# IDs dos pontos derivados do conteúdo: reingerir o mesmo documento cai no mesmo ponto
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "ai_platform_labs/hybrid_search")
+
+
+def point_id(doc: Union[str, Chunk], metadata: Optional[Dict[str, Any]] = None) -> str:
+    # Tenant e documento pai fazem parte da identidade: o mesmo texto em tenants (ou
+    # documentos) diferentes são pontos diferentes
+    parent = doc.parent_id if isinstance(doc, Chunk) else ""
+    tenant = (metadata or {}).get("tenant", "")
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{tenant}\x1f{parent}\x1f{doc_hash(_text(doc))}"))
+
+
+def _payload(doc: Union[str, Chunk], metadata: Optional[Dict[str, Any]] = None) -> dict:
+    text = _text(doc)
+    payload = {**(metadata or {}), "text": text, "doc_hash": doc_hash(text)}
+    if isinstance(doc, Chunk):
+        payload["parent_id"] = doc.parent_id
+        payload["chunk_index"] = doc.chunk_index
+    return payload
+
 
 class RetrievalPlatform:
-    def __init__(self):
+    def __init__(
+        self,
+        cache_size: int = 1024,
+        cache_ttl: float = 300.0,
+        path: Optional[str] = None,
+        backend: str = "torch",
+        onnx_dir: Optional[str] = None,
+        onnx_threads: Optional[int] = None,
+    ):
         # Usando memória para garantir que rode aí sem precisar configurar Docker agora
         # Se quiser usar Docker, mude para "http://localhost:6333"
-        self.client = QdrantClient(":memory:") 
-        self.dense_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        # Com `path`, o Qdrant roda embarcado persistindo em disco: o restart reaproveita
+        # vetores, payloads e estatísticas BM25 sem reprocessar o corpus.
+        self.path = path
+        self.client = QdrantClient(path=path) if path else QdrantClient(":memory:")
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Backend '{backend}' desconhecido. Use 'torch' ou 'onnx'.")
+        # Modelos vêm do registro do processo: várias plataformas (ou threads) compartilham
+        # os mesmos pesos. Com backend="onnx", usa os int8 gerados por export_onnx.py.
+        # Só são carregados no primeiro encode/rerank (ou no warm_up), então importar e
+        # instanciar a plataforma não paga o custo do torch.
+        self._model_args = (backend, onnx_dir, onnx_threads)
+        self._dense_model = None
+        self._reranker = None
+        self.sparse_encoders = {}
+        # Caches de query: embedding por texto normalizado; candidatos fundidos e
+        # resultado do reranker por (coleção, texto normalizado)
+        self.embedding_cache = TTLCache(cache_size, cache_ttl)
+        self.candidate_cache = TTLCache(cache_size, cache_ttl)
+        self.rerank_cache = TTLCache(cache_size, cache_ttl)
+        self._rerank_ms_per_pair = None
+        self.content_hashes = {}
+        # Chamados com o nome da coleção sempre que os caches dela são invalidados (ingest/reindex),
+        # para quem guarda resultados de busca fora da plataforma (ex. o memo do StartupSearchTool)
+        self._invalidation_listeners: List[Callable[[str], None]] = []
+        if path:
+            self._load_state()
             
+    @property
+    def dense_model(self):
+        if self._dense_model is None:
+            self._dense_model = model_registry.dense_model(*self._model_args)
+        return self._dense_model
+
+    @property
+    def reranker(self):
+        if self._reranker is None:
+            self._reranker = model_registry.reranker(*self._model_args)
+        return self._reranker
+
+    @property
+    def models_loaded(self) -> bool:
+        return self._dense_model is not None and self._reranker is not None
+
+    def warm_up(self, background: bool = False) -> Optional[threading.Thread]:
+        # Carrega os dois modelos e roda uma inferência para aquecer os kernels
+        def load():
+            self.dense_model.encode(["warm up"])
+            self.reranker.predict([("warm up", "warm up")])
+
+        if not background:
+            load()
+            return None
+        thread = threading.Thread(target=load, name="retrieval-warm-up", daemon=True)
+        thread.start()
+        return thread
+
     def create_collection(self, name):
         if self.client.collection_exists(collection_name=name):
             self.client.delete_collection(collection_name=name)
@@ -24,79 +172,364 @@ class RetrievalPlatform:
                 "text-sparse": models.SparseVectorParams()
             }
         )
+        for field, schema in INDEXED_FIELDS.items():
+            self.client.create_payload_index(collection_name=name, field_name=field, field_schema=schema)
+        self.sparse_encoders[name] = BM25SparseEncoder()
+        self.content_hashes.pop(name, None)
+        self._invalidate_cache(name)
+        self._save_state(name)
 
-    def _get_sparse_vector(self, text: str):
-        tokens = text.lower().split()
-        if not tokens:
-            return models.SparseVector(indices=[], values=[])
-            
-        model = fastbm25([tokens])
-        
-        indices = []
-        values = []
-        
-        for word in set(tokens):
-            # Usamos o IDF para o peso
-            weight = model.idf.get(word, 0.0)
-            if weight > 0:
-                idx = abs(hash(word)) % 1000000
-                indices.append(idx)
-                values.append(float(weight))
-            
+    def _state_file(self, collection: str) -> str:
+        return os.path.join(self.path, "retrieval_state", f"{collection}.json")
+
+    def _load_state(self):
+        for collection in self.client.get_collections().collections:
+            state_file = self._state_file(collection.name)
+            if not os.path.exists(state_file):
+                continue
+            with open(state_file) as f:
+                state = json.load(f)
+            self.sparse_encoders[collection.name] = BM25SparseEncoder.from_dict(state["sparse"])
+            if state.get("content_hash"):
+                self.content_hashes[collection.name] = state["content_hash"]
+
+    def _save_state(self, collection: str):
+        if not self.path:
+            return
+        state_file = self._state_file(collection)
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        with open(state_file, "w") as f:
+            json.dump({
+                "sparse": self.sparse_encoder(collection).to_dict(),
+                "content_hash": self.content_hashes.get(collection),
+            }, f)
+
+    def stored_content_hash(self, collection: str) -> Optional[str]:
+        return self.content_hashes.get(collection)
+
+    def set_content_hash(self, collection: str, content_hash: str):
+        self.content_hashes[collection] = content_hash
+        self._save_state(collection)
+
+    def _invalidate_cache(self, collection: str):
+        # key[0] é a tupla de coleções da busca (mais de uma na busca federada)
+        self.candidate_cache.invalidate(lambda key: collection in key[0])
+        self.rerank_cache.invalidate(lambda key: collection in key[0])
+        for listener in self._invalidation_listeners:
+            listener(collection)
+
+    def add_invalidation_listener(self, listener: Callable[[str], None]):
+        self._invalidation_listeners.append(listener)
+
+    def cache_stats(self):
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "candidates": self.candidate_cache.stats(),
+            "rerank": self.rerank_cache.stats(),
+        }
+
+    def sparse_encoder(self, collection: str) -> BM25SparseEncoder:
+        # Estatísticas BM25 por coleção (DF, tamanho médio), atualizadas a cada ingestão
+        return self.sparse_encoders.setdefault(collection, BM25SparseEncoder())
+
+    def save_sparse_stats(self, collection: str, path: str):
+        self.sparse_encoder(collection).save(path)
+
+    def load_sparse_stats(self, collection: str, path: str):
+        # Os índices são estáveis entre processos, então as estatísticas podem ser geradas
+        # offline e compartilhadas entre as réplicas
+        self.sparse_encoders[collection] = BM25SparseEncoder.load(path)
+
+    def _get_sparse_vector(self, collection: str, text: str, is_query: bool = False):
+        encoder = self.sparse_encoder(collection)
+        if is_query:
+            indices, values = encoder.encode_query(text)
+        else:
+            indices, values = encoder.encode_document(text)
         return models.SparseVector(indices=indices, values=values)
 
-    def ingest(self, collection: str, documents: List[str]):
-        points = []
-        for i, doc in enumerate(documents):
-            dense_vec = self.dense_model.encode(doc).tolist()
-            sparse_vec = self._get_sparse_vector(doc)
-            
-            points.append(
+    def chunker(self, **kwargs) -> Chunker:
+        # Conta tokens com o tokenizer do próprio modelo denso: ingest(col, platform.chunker().split(docs))
+        return Chunker(tokenizer=getattr(self.dense_model, "tokenizer", None), **kwargs)
+
+    def ingest(
+        self,
+        collection: str,
+        documents: Iterable[Union[str, Chunk]],
+        batch_size: int = 64,
+        upsert_batch_size: int = 512,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        # Aceita lista ou gerador: cada bloco de `upsert_batch_size` documentos é
+        # codificado em lotes de `batch_size` e enviado ao Qdrant antes de ler o próximo,
+        # então a memória fica constante independente do tamanho do corpus.
+        # `metadata` (ex.: tenant, source) vai no payload de todos os documentos; o
+        # timestamp padrão é o momento da ingestão.
+        start = time.perf_counter()
+        metadata = {"timestamp": time.time(), **(metadata or {})}
+        # IDs vêm do conteúdo (point_id): documentos já armazenados são pulados, então
+        # reingerir é idempotente e não conta o mesmo texto duas vezes nas estatísticas BM25.
+        total = 0
+        skipped = 0
+
+        for block in _batched(documents, upsert_batch_size):
+            ids = [point_id(doc, metadata) for doc in block]
+            existing = {
+                str(point.id) for point in self.client.retrieve(
+                    collection_name=collection, ids=list(set(ids)), with_payload=False, with_vectors=False
+                )
+            }
+            new = {}
+            for pid, doc in zip(ids, block):
+                if pid not in existing:
+                    new.setdefault(pid, doc)
+            skipped += len(block) - len(new)
+            if not new:
+                continue
+
+            batch = list(new.values())
+            texts = [_text(doc) for doc in batch]
+            self.sparse_encoder(collection).partial_fit(texts)
+            dense_vecs = self.dense_model.encode(texts, batch_size=batch_size)
+
+            points = [
                 models.PointStruct(
-                    id=i,
+                    id=pid,
                     vector={
-                        "": dense_vec,          # Vetor padrão (sem nome)
-                        "text-sparse": sparse_vec # Vetor nomeado
+                        "": dense_vec.tolist(),                 # Vetor padrão (sem nome)
+                        "text-sparse": self._get_sparse_vector(collection, _text(doc))  # Vetor nomeado
                     },
-                    payload={"text": doc}
+                    payload=_payload(doc, metadata)
                 )
+                for (pid, doc), dense_vec in zip(new.items(), dense_vecs)
+            ]
+
+            self.client.upsert(collection_name=collection, points=points)
+            total += len(batch)
+
+        self._invalidate_cache(collection)
+        self._save_state(collection)
+
+        elapsed = time.perf_counter() - start
+        docs_per_sec = total / elapsed if elapsed > 0 else 0.0
+        print(f"Ingestão de {total} documentos concluída em {elapsed:.2f}s ({docs_per_sec:.1f} docs/s, {skipped} já existiam).")
+        return {"documents": total, "skipped": skipped, "seconds": elapsed, "docs_per_sec": docs_per_sec}
+
+    def reindex(
+        self,
+        collection: str,
+        documents: Iterable[Union[str, Chunk]],
+        content_hash: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        # Sincronização incremental: compara os IDs de conteúdo do conjunto com os que já
+        # estão salvos, embeda só os novos/alterados e apaga os que saíram do conjunto. O
+        # custo é proporcional à mudança, não ao tamanho do corpus.
+        # Com tenant/source em `metadata`, só os documentos desse escopo são comparados,
+        # então reindexar um tenant não apaga os dos outros.
+        wanted = {point_id(doc, metadata): doc for doc in documents}
+        scope = build_filter({field: metadata[field] for field in ("tenant", "source") if field in (metadata or {})})
+
+        stored = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection, scroll_filter=scope, limit=1024, offset=offset,
+                with_payload=["text"], with_vectors=False,
             )
-        
-        self.client.upsert(collection_name=collection, points=points)
-        print(f"Ingestão de {len(documents)} documentos concluída.")
+            for point in points:
+                stored[str(point.id)] = point.payload["text"]
+            if offset is None:
+                break
 
-    def hybrid_search(self, query, collection):
-        query_dense = self.dense_model.encode(query).tolist()
-        query_sparse = self._get_sparse_vector(query)
-        
+        removed = [pid for pid in stored if pid not in wanted]
+        added = [doc for pid, doc in wanted.items() if pid not in stored]
+
+        if removed:
+            self.client.delete(
+                collection_name=collection,
+                points_selector=models.PointIdsList(points=removed),
+            )
+            self.sparse_encoder(collection).remove(stored[pid] for pid in removed)
+        if added:
+            self.ingest(collection, added, metadata=metadata)
+
+        self._invalidate_cache(collection)
+        self.set_content_hash(collection, content_hash or documents_hash(_text(doc) for doc in wanted.values()))
+
+        summary = {"added": len(added), "removed": len(removed), "unchanged": len(stored) - len(removed)}
+        print(f"Reindexação de '{collection}': {summary}")
+        return summary
+
+    def _encode_queries(self, queries: List[str]):
+        keys = [normalize_query(q) for q in queries]
+        vectors = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing:
+            # Uma única chamada ao modelo para todas as queries fora do cache
+            encoded = self.dense_model.encode([queries[i] for i in missing])
+            for i, vec in zip(missing, encoded):
+                vectors[i] = vec.tolist()
+                self.embedding_cache.set(keys[i], vectors[i])
+        return vectors
+
+    def hybrid_search(self, query, collection, **options):
+        return self.batch_hybrid_search([query], collection, **options)[0]
+
+    def batch_hybrid_search(
+        self,
+        queries: List[str],
+        collection: Union[str, Sequence[str]],
+        prefetch_limit: int = 20,
+        rerank_depth: int = 10,
+        top_k: int = 5,
+        skip_margin: Optional[float] = None,
+        rerank_budget_pairs: Optional[int] = None,
+        rerank_budget_ms: Optional[float] = None,
+        collapse_by_parent: bool = False,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        # Cascata: prefetch denso + esparso (prefetch_limit cada) -> RRF (rerank_depth) -> CrossEncoder.
+        # - skip_margin: se o k-ésimo score RRF supera o (k+1)-ésimo por essa margem relativa,
+        #   o top-k já está decidido e o CrossEncoder é pulado (o score devolvido é o do RRF).
+        # - rerank_budget_pairs / rerank_budget_ms: limita quantos candidatos (os melhores pelo
+        #   RRF) passam no CrossEncoder; os demais seguem na ordem do RRF depois dos reranqueados.
+        # - filters: filtro de payload (ver build_filter) aplicado dentro dos dois prefetch, então
+        #   o Qdrant só visita vetores do tenant/fonte pedidos.
+        # - collection: uma lista de coleções faz uma busca federada com um único resultado fundido.
+        # - collapse_by_parent: com ingestão em chunks, devolve só o melhor chunk de cada documento.
+        collections = (collection,) if isinstance(collection, str) else tuple(collection)
+        normalized = [normalize_query(q) for q in queries]
+        candidate_keys = [(collections, n, prefetch_limit, rerank_depth, _filter_key(filters)) for n in normalized]
+        keys = [
+            key + (top_k, skip_margin, rerank_budget_pairs, rerank_budget_ms, collapse_by_parent)
+            for key in candidate_keys
+        ]
+        outputs = [self.rerank_cache.get(key) for key in keys]
+        pending = [i for i, out in enumerate(outputs) if out is None]
+        if not pending:
+            return outputs
+
+        candidates = {i: self.candidate_cache.get(candidate_keys[i]) for i in pending}
+        to_fetch = [i for i in pending if candidates[i] is None]
+        if to_fetch:
+            dense_vecs = self._encode_queries([queries[i] for i in to_fetch])
+            query_filter = build_filter(filters)
+            per_collection = [
+                self._fetch_candidates(name, [queries[i] for i in to_fetch], dense_vecs,
+                                       prefetch_limit, rerank_depth, query_filter)
+                for name in collections
+            ]
+            for j, i in enumerate(to_fetch):
+                if len(collections) == 1:
+                    candidates[i] = per_collection[0][j]
+                else:
+                    candidates[i] = self._federate(
+                        [(name, results[j]) for name, results in zip(collections, per_collection)], rerank_depth
+                    )
+                self.candidate_cache.set(candidate_keys[i], candidates[i])
+
+        max_pairs = self._rerank_pair_budget(rerank_budget_pairs, rerank_budget_ms)
+        depths = {}
+        for i in pending:
+            if skip_margin is not None and self._is_separated(candidates[i], top_k, skip_margin):
+                depths[i] = 0
+            elif max_pairs is not None:
+                depths[i] = min(len(candidates[i]), max_pairs)
+            else:
+                depths[i] = len(candidates[i])
+
+        # Todos os pares (query, passagem) do lote vão numa única chamada ao CrossEncoder
+        pairs = [(queries[i], res.payload['text']) for i in pending for res in candidates[i][:depths[i]]]
+        ranks = []
+        if pairs:
+            start = time.perf_counter()
+            ranks = self.reranker.predict(pairs)
+            self._record_rerank_latency(len(pairs), time.perf_counter() - start)
+
+        offset = 0
+        for i in pending:
+            results = candidates[i]
+            depth = depths[i]
+            scores = ranks[offset:offset + depth]
+            offset += depth
+
+            reranked = sorted(zip(results[:depth], scores), key=lambda x: x[1], reverse=True)
+            fused = [(res, res.score) for res in results[depth:]]
+            combined = reranked + fused
+            if collapse_by_parent:
+                combined = collapse_chunks(combined)
+            combined = combined[:top_k]
+            self.rerank_cache.set(keys[i], combined)
+            outputs[i] = combined
+        return outputs
+
+    def _fetch_candidates(self, collection: str, queries: List[str], dense_vecs: List[List[float]],
+                          prefetch_limit: int, limit: int, query_filter: Optional[models.Filter]):
         # --- CORREÇÃO DEFINITIVA ---
         # A nova API usa 'query' e 'using', não 'vector'.
-        results = self.client.query_points(
-            collection_name=collection,
-            prefetch=[
-                models.Prefetch(
-                    query=query_dense,  # O dado vai aqui (lista de floats)
-                    using=None,         # None = usa o vetor padrão (denso)
-                    limit=20
-                ),
-                models.Prefetch(
-                    query=query_sparse, # O dado vai aqui (SparseVector)
-                    using="text-sparse",# Nome do vetor esparso configurado
-                    limit=20
-                ),
-            ],
-            query=models.FusionQuery(fusion=models.Fusion.RRF),
-            limit=10
-        ).points
-        
-        if not results:
-            return []
+        requests = [
+            models.QueryRequest(
+                prefetch=[
+                    models.Prefetch(
+                        query=query_dense,  # O dado vai aqui (lista de floats)
+                        using=None,         # None = usa o vetor padrão (denso)
+                        limit=prefetch_limit,
+                        filter=query_filter,
+                    ),
+                    models.Prefetch(
+                        # O dado vai aqui (SparseVector)
+                        query=self._get_sparse_vector(collection, query, is_query=True),
+                        using="text-sparse",# Nome do vetor esparso configurado
+                        limit=prefetch_limit,
+                        filter=query_filter,
+                    ),
+                ],
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                filter=query_filter,
+                limit=limit,
+                with_payload=True
+            )
+            for query, query_dense in zip(queries, dense_vecs)
+        ]
+        responses = self.client.query_batch_points(collection_name=collection, requests=requests)
+        return [response.points for response in responses]
 
-        passages = [res.payload['text'] for res in results]
-        ranks = self.reranker.predict([(query, p) for p in passages])
-        
-        combined = sorted(zip(results, ranks), key=lambda x: x[1], reverse=True)
-        return combined[:5]
+    @staticmethod
+    def _federate(results_by_collection: List[Tuple[str, list]], limit: int) -> list:
+        # Scores RRF de coleções diferentes não são comparáveis: refaz a fusão pela posição de
+        # cada candidato na sua coleção e marca de onde ele veio. O CrossEncoder, que vem
+        # depois, dá scores comparáveis entre coleções.
+        merged = []
+        for name, points in results_by_collection:
+            for rank, point in enumerate(points):
+                payload = {**(point.payload or {}), "collection": name}
+                merged.append(point.model_copy(update={"score": 1 / (RRF_K + rank + 1), "payload": payload}))
+        merged.sort(key=lambda point: point.score, reverse=True)
+        return merged[:limit]
+
+    @staticmethod
+    def _is_separated(results, top_k: int, margin: float) -> bool:
+        # Sem um (k+1)-ésimo candidato não há gap para medir: reranqueia (o custo é pequeno) para
+        # que todas as queries do lote voltem com scores do CrossEncoder
+        if len(results) <= top_k:
+            return False
+        kth, next_score = results[top_k - 1].score, results[top_k].score
+        return kth > 0 and (kth - next_score) / kth >= margin
+
+    def _record_rerank_latency(self, pairs: int, seconds: float):
+        # Média móvel do custo por par, usada para converter orçamento em ms para pares
+        per_pair = seconds * 1000 / pairs
+        previous = self._rerank_ms_per_pair
+        self._rerank_ms_per_pair = per_pair if previous is None else 0.8 * previous + 0.2 * per_pair
+
+    def _rerank_pair_budget(self, budget_pairs: Optional[int], budget_ms: Optional[float]) -> Optional[int]:
+        limits = []
+        if budget_pairs is not None:
+            limits.append(budget_pairs)
+        if budget_ms is not None and self._rerank_ms_per_pair:
+            limits.append(max(1, int(budget_ms / self._rerank_ms_per_pair)))
+        return min(limits) if limits else None
 
 # --- Execução ---
 if __name__ == "__main__":
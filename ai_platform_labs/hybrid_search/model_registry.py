@@ -0,0 +1,108 @@
+import os
+import resource
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+try:
+    from .onnx_backend import DEFAULT_ONNX_DIR, OnnxCrossEncoder, OnnxDenseEncoder
+except ImportError:
+    from onnx_backend import DEFAULT_ONNX_DIR, OnnxCrossEncoder, OnnxDenseEncoder
+
+DENSE_MODEL = 'all-MiniLM-L6-v2'
+RERANKER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+
+def _current_rss_mb() -> float:
+    # RSS atual pelo /proc (Linux); fora dele, o pico do processo é a melhor aproximação
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _param_mb(model) -> Optional[float]:
+    # Tamanho dos pesos em memória (só modelos PyTorch expõem parameters())
+    parameters = getattr(model, "parameters", None)
+    if parameters is None:
+        return None
+    return sum(p.numel() * p.element_size() for p in parameters()) / 1024 / 1024
+
+
+class ModelRegistry:
+    """
+    Registro de modelos do processo: cada modelo é carregado uma única vez, na primeira
+    vez que alguém pede, e compartilhado entre instâncias do RetrievalPlatform e threads.
+    """
+
+    def __init__(self):
+        self._models: Dict[Hashable, Any] = {}
+        self._stats: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable, loader: Callable[[], Any]):
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        # Lock por chave: threads pedindo o mesmo modelo esperam um único carregamento,
+        # sem bloquear o carregamento de outros modelos em paralelo
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self._models:
+                return self._models[key]
+
+            rss_before = _current_rss_mb()
+            start = time.perf_counter()
+            model = loader()
+            self._stats[key] = {
+                "load_seconds": time.perf_counter() - start,
+                "rss_delta_mb": _current_rss_mb() - rss_before,
+                "param_mb": _param_mb(model),
+            }
+            self._models[key] = model
+            print(f"[ModelRegistry] {key} carregado: {self._stats[key]}")
+        return model
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {"/".join(str(part) for part in key if part is not None): s for key, s in self._stats.items()}
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+
+
+registry = ModelRegistry()
+
+
+def _load_sentence_transformers(cls, name: str):
+    # Pesos em safetensors são mapeados em memória (mmap) em vez de copiados para o heap;
+    # versões antigas do sentence-transformers não aceitam model_kwargs
+    try:
+        return cls(name, model_kwargs={"use_safetensors": True})
+    except TypeError:
+        return cls(name)
+
+
+def dense_model(backend: str = "torch", onnx_dir: Optional[str] = None, onnx_threads: Optional[int] = None):
+    if backend == "onnx":
+        model_dir = os.path.join(onnx_dir or DEFAULT_ONNX_DIR, "dense")
+        return registry.get(("onnx", model_dir, onnx_threads),
+                            lambda: OnnxDenseEncoder(model_dir, intra_op_threads=onnx_threads))
+
+    from sentence_transformers import SentenceTransformer
+    return registry.get(("torch", DENSE_MODEL), lambda: _load_sentence_transformers(SentenceTransformer, DENSE_MODEL))
+
+
+def reranker(backend: str = "torch", onnx_dir: Optional[str] = None, onnx_threads: Optional[int] = None):
+    if backend == "onnx":
+        model_dir = os.path.join(onnx_dir or DEFAULT_ONNX_DIR, "reranker")
+        return registry.get(("onnx", model_dir, onnx_threads),
+                            lambda: OnnxCrossEncoder(model_dir, intra_op_threads=onnx_threads))
+
+    from sentence_transformers import CrossEncoder
+    return registry.get(("torch", RERANKER_MODEL), lambda: _load_sentence_transformers(CrossEncoder, RERANKER_MODEL))
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Espaço de índices do vetor esparso (o Qdrant aceita qualquer uint32)
+DEFAULT_DIM = 2 ** 24
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def stable_term_index(term: str, dim: int = DEFAULT_DIM) -> int:
+    # O hash() do Python tem salt por processo: réplicas e restarts geravam índices
+    # diferentes para o mesmo termo. blake2b é determinístico em qualquer máquina.
+    digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % dim
+
+
+class BM25SparseEncoder:
+    """
+    Encoder BM25 com estatísticas da coleção inteira.
+
+    O documento guarda só a parte de TF saturado do BM25 e a query carrega o IDF,
+    então o produto escalar feito pelo Qdrant é o score BM25. Como o IDF fica do lado
+    da query, dá para atualizar as estatísticas a cada ingestão sem reindexar nada.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, dim: int = DEFAULT_DIM):
+        self.k1 = k1
+        self.b = b
+        self.dim = dim
+        self.num_docs = 0
+        self.total_len = 0
+        self.doc_freq: Dict[str, int] = {}
+        self.collisions = 0
+        self._idf: Dict[str, float] = {}
+        self._term_ids: Dict[str, int] = {}
+        self._index_owner: Dict[int, str] = {}
+
+    @property
+    def avg_doc_len(self) -> float:
+        return self.total_len / self.num_docs if self.num_docs else 0.0
+
+    def partial_fit(self, documents: Iterable[str]):
+        # Atualiza DF e tamanho médio de forma incremental (um lote de ingestão por vez)
+        for doc in documents:
+            tokens = tokenize(doc)
+            self.num_docs += 1
+            self.total_len += len(tokens)
+            for term in set(tokens):
+                if term not in self.doc_freq:
+                    self._register_term(term)
+                self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+        self._idf = {}
+        return self
+
+    def remove(self, documents: Iterable[str]):
+        # Desfaz o partial_fit de documentos apagados da coleção
+        for doc in documents:
+            tokens = tokenize(doc)
+            self.num_docs -= 1
+            self.total_len -= len(tokens)
+            for term in set(tokens):
+                df = self.doc_freq.get(term, 0) - 1
+                if df > 0:
+                    self.doc_freq[term] = df
+                else:
+                    self.doc_freq.pop(term, None)
+        self._idf = {}
+        return self
+
+    def fit(self, documents: Iterable[str]):
+        self.num_docs = 0
+        self.total_len = 0
+        self.doc_freq = {}
+        self.collisions = 0
+        self._term_ids = {}
+        self._index_owner = {}
+        return self.partial_fit(documents)
+
+    def _register_term(self, term: str):
+        idx = stable_term_index(term, self.dim)
+        owner = self._index_owner.setdefault(idx, term)
+        if owner != term:
+            # Dois termos no mesmo índice: os pesos somam no produto escalar
+            self.collisions += 1
+        self._term_ids[term] = idx
+
+    def collision_stats(self) -> Dict[str, float]:
+        vocab_size = len(self._term_ids)
+        return {
+            "vocab_size": vocab_size,
+            "collisions": self.collisions,
+            "collision_rate": self.collisions / vocab_size if vocab_size else 0.0,
+        }
+
+    def idf(self, term: str) -> float:
+        # Tabela de IDF pré-calculada sob demanda e invalidada a cada partial_fit
+        if not self._idf and self.doc_freq:
+            n = self.num_docs
+            self._idf = {
+                t: math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for t, df in self.doc_freq.items()
+            }
+        return self._idf.get(term, 0.0)
+
+    def _term_index(self, term: str) -> int:
+        idx = self._term_ids.get(term)
+        return idx if idx is not None else stable_term_index(term, self.dim)
+
+    def encode_document(self, text: str) -> Tuple[List[int], List[float]]:
+        tokens = tokenize(text)
+        if not tokens:
+            return [], []
+
+        avg_len = self.avg_doc_len or len(tokens)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / avg_len)
+
+        indices = []
+        values = []
+        for term, tf in Counter(tokens).items():
+            indices.append(self._term_index(term))
+            values.append(tf * (self.k1 + 1) / (tf + norm))
+        return indices, values
+
+    def encode_query(self, text: str) -> Tuple[List[int], List[float]]:
+        indices = []
+        values = []
+        for term in set(tokenize(text)):
+            weight = self.idf(term)
+            # Termos fora do vocabulário não casam com nenhum documento
+            if weight > 0:
+                indices.append(self._term_index(term))
+                values.append(weight)
+        return indices, values
+
+    def to_dict(self) -> Dict:
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "dim": self.dim,
+            "num_docs": self.num_docs,
+            "total_len": self.total_len,
+            "doc_freq": self.doc_freq,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "BM25SparseEncoder":
+        encoder = cls(k1=state["k1"], b=state["b"], dim=state["dim"])
+        encoder.num_docs = state["num_docs"]
+        encoder.total_len = state["total_len"]
+        encoder.doc_freq = state["doc_freq"]
+        for term in encoder.doc_freq:
+            encoder._register_term(term)
+        return encoder
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25SparseEncoder":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -1,17 +1,25 @@
+import asyncio
 import sys
 import os
-import operator
+import threading
 import time
 import uuid
-from typing import Annotated, TypedDict, List
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Annotated, Any, Dict, Tuple, TypedDict, List, Union
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.messages import (
+    BaseMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage, get_buffer_string,
+)
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
-from typing import Type
+from typing import Optional, Type
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph.message import add_messages
 
 
 # Adiciona o diretório raiz 'snippets' ao caminho de busca do Python
@@ -22,6 +30,12 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'
 
 # Agora a importação funcionará perfeitamente
 from ai_platform_labs.hybrid_search.hybrid_search import RetrievalPlatform
+from ai_platform_labs.internal_search_agent.tracing import Tracer, adispatch_cache_hit, dispatch_cache_hit
+
+# Orçamento de tokens do histórico enviado ao LLM; rodadas mais antigas viram resumo
+HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKENS", "3000"))
+# Saídas de ferramenta de rodadas anteriores são cortadas neste tamanho
+OLD_TOOL_OUTPUT_CHARS = 500
 
 
 class SearchInput(BaseModel):
@@ -33,16 +47,102 @@ class StartupSearchTool(BaseTool):
     description: str = "Search the startup docs for the given query."
     args_schema: Type[BaseModel] = SearchInput
 
-    _platform: RetrievalPlatform = RetrievalPlatform()
-
-    def __init__(self, platform: RetrievalPlatform, **kwargs):
+    # Sem instância padrão: construir um RetrievalPlatform aqui carregava um segundo par de
+    # modelos no import. A plataforma é sempre injetada pelo __init__.
+    _platform: Optional[RetrievalPlatform] = None
+    # Coleção (ou lista de coleções, busca federada) e filtro de payload, ex. {"tenant": "acme"}
+    _collections: Union[str, List[str]] = "startup_docs"
+    _filters: Optional[Dict[str, Any]] = None
+    # Várias chamadas da mesma rodada do LLM rodam em paralelo neste pool; o limite evita
+    # disputar CPU entre muitas buscas (cada uma roda encoder e reranker)
+    _executor: Optional[ThreadPoolExecutor] = None
+    # Resultado por (thread_id, ferramenta, consulta normalizada), em LRU de `memo_size` entradas:
+    # a mesma pergunta repetida na conversa não volta ao banco vetorial nem ao reranker.
+    # Entradas expiram em `memo_ttl` segundos e o memo é limpo quando a coleção é reingerida.
+    _memo: "Optional[OrderedDict[Tuple[str, str, str], Tuple[Future, float]]]" = None
+    _memo_size: int = 256
+    _memo_ttl: float = 300.0
+    _memo_lock: Optional[threading.Lock] = None
+
+    def __init__(
+        self,
+        platform: RetrievalPlatform,
+        collections: Union[str, List[str]] = "startup_docs",
+        filters: Optional[Dict[str, Any]] = None,
+        max_workers: int = 4,
+        memo_size: int = 256,
+        memo_ttl: float = 300.0,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self._platform = platform
-
-    def _run(self, query: str) -> str:
+        self._collections = collections
+        self._filters = filters
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search_tool")
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self._memo_ttl = memo_ttl
+        self._memo_lock = threading.Lock()
+        platform.add_invalidation_listener(self._on_collection_invalidated)
+
+    def clear_memo(self):
+        with self._memo_lock:
+            self._memo.clear()
+
+    def _on_collection_invalidated(self, collection: str):
+        # ingest/reindex numa coleção desta tool: resultados memorizados podem estar velhos
+        collections = [self._collections] if isinstance(self._collections, str) else self._collections
+        if collection in collections:
+            self.clear_memo()
+
+    def _submit(self, query: str, config: Optional[RunnableConfig]) -> Tuple[Future, bool]:
+        thread_id = str((config or {}).get("configurable", {}).get("thread_id", ""))
+        key = (thread_id, self.name, " ".join(query.lower().split()))
+        with self._memo_lock:
+            future, created_at = self._memo.get(key, (None, 0.0))
+            # Guardamos o Future (não só o resultado): chamadas iguais na mesma rodada esperam
+            # uma única busca. Falhas, cancelamentos e entradas expiradas não contam.
+            if (
+                future is not None
+                and time.monotonic() - created_at <= self._memo_ttl
+                and not future.cancelled()
+                and not (future.done() and future.exception() is not None)
+            ):
+                self._memo.move_to_end(key)
+                print(f"\n   [System] ♻️ Reaproveitando busca anterior para: '{query}'")
+                return future, True
+            future = self._executor.submit(self._search, query)
+            self._memo[key] = (future, time.monotonic())
+            self._memo.move_to_end(key)
+            if len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        return future, False
+
+    # O `config` injetado é o do nó (usado só para o thread_id); o cache hit vai pelos callbacks
+    # do run da tool, para marcar o span tool:search_startup_docs no Tracer
+    def _run(
+        self, query: str, config: RunnableConfig, run_manager: Optional[CallbackManagerForToolRun] = None
+    ) -> str:
+        future, hit = self._submit(query, config)
+        if hit and run_manager is not None:
+            dispatch_cache_hit("memo", run_manager.get_child())
+        return future.result()
+
+    async def _arun(
+        self, query: str, config: RunnableConfig, run_manager: Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> str:
+        # Não bloqueia o event loop: o ToolNode assíncrono executa as tool calls com gather
+        future, hit = self._submit(query, config)
+        if hit and run_manager is not None:
+            await adispatch_cache_hit("memo", run_manager.get_child())
+        # shield: o Future é compartilhado pelo memo; cancelar esta chamada não pode
+        # cancelar a busca para as outras que esperam por ela
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _search(self, query: str) -> str:
         print(f"\n   [System] 🔍 Executando busca no banco vetorial para: '{query}'...")
 
-        search_results = self._platform.hybrid_search(query, "startup_docs")
+        search_results = self._platform.hybrid_search(query, self._collections, filters=self._filters)
 
         if not search_results:
             return "No information found in the internal docs."
@@ -55,24 +155,102 @@ class StartupSearchTool(BaseTool):
 
 # --- Definição do Estado do Agente ---
 class AgentState(TypedDict):
-    # O histórico de mensagens permite ao agente ter "memória"
-    messages: Annotated[List[BaseMessage], operator.add]
-    
+    # O histórico de mensagens permite ao agente ter "memória".
+    # add_messages (em vez de operator.add) aceita RemoveMessage: a compactação encolhe o estado salvo
+    messages: Annotated[List[BaseMessage], add_messages]
+    # Resumo das rodadas que a compactação tirou de `messages`
+    summary: str
+
 
 # --- O Nó de Decisão (O "Cérebro") ---
 class AgentOrchestrator:
-    def __init__(self, tools: List[BaseTool]):
+    def __init__(self, tools: List[BaseTool], history_token_budget: int = HISTORY_TOKEN_BUDGET):
         self.tools = tools
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0).bind_tools(tools)
+        self.chat_model = ChatOpenAI(model="gpt-4o", temperature=0)
+        self.llm = self.chat_model.bind_tools(tools)
+        # Modelo barato só para resumir o histórico compactado
+        self.summarizer = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+        self.history_token_budget = history_token_budget
 
     def call_model(self, state: AgentState):
         """Decide se responde diretamente ou se usa a ferramenta de busca."""
         
         print(f"\n🤖 [Agente] Pensando...")
 
-        messages = state['messages']
+        messages = self._with_summary(state)
         response = self.llm.invoke(messages)
-
+        return self._decision(response)
+
+    async def acall_model(self, state: AgentState):
+        """Versão assíncrona do call_model, usada com app.ainvoke/app.astream."""
+
+        print("\n🤖 [Agente] Pensando...")
+
+        response = await self.llm.ainvoke(self._with_summary(state))
+        return self._decision(response)
+
+    def _with_summary(self, state: AgentState) -> List[BaseMessage]:
+        summary = state.get("summary")
+        if not summary:
+            return state["messages"]
+        return [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] + state["messages"]
+
+    def compact_history(self, state: AgentState):
+        """Mantém o histórico dentro do orçamento de tokens antes de cada pergunta nova."""
+        dropped, updates = self._plan_compaction(state["messages"])
+        if not dropped:
+            return {"messages": updates}
+        summary = self.summarizer.invoke(self._summary_prompt(state, dropped)).content
+        return {"messages": updates, "summary": summary}
+
+    async def acompact_history(self, state: AgentState):
+        dropped, updates = self._plan_compaction(state["messages"])
+        if not dropped:
+            return {"messages": updates}
+        summary = (await self.summarizer.ainvoke(self._summary_prompt(state, dropped))).content
+        return {"messages": updates, "summary": summary}
+
+    def _plan_compaction(self, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        # A rodada atual (da última HumanMessage em diante) nunca é mexida
+        turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        current_turn = turn_starts[-1] if turn_starts else 0
+
+        # 1. Saídas longas de ferramenta de rodadas anteriores são cortadas (mesmo id = substitui)
+        kept = list(messages)
+        truncated = []
+        for i in range(current_turn):
+            m = kept[i]
+            if isinstance(m, ToolMessage) and isinstance(m.content, str) and len(m.content) > OLD_TOOL_OUTPUT_CHARS:
+                kept[i] = m.model_copy(update={"content": m.content[:OLD_TOOL_OUTPUT_CHARS] + " ...[truncado]"})
+                truncated.append(i)
+
+        # 2. Acima do orçamento, rodadas inteiras saem (a partir da mais antiga), para não
+        # separar uma tool call da sua resposta
+        cut = 0
+        for start in turn_starts[1:]:
+            if self.chat_model.get_num_tokens_from_messages(kept[cut:]) <= self.history_token_budget:
+                break
+            cut = start
+
+        dropped = kept[:cut]
+        updates = [RemoveMessage(id=m.id) for m in dropped] + [kept[i] for i in truncated if i >= cut]
+        if dropped:
+            print(f"🗜️ [Memória] Compactando {len(dropped)} mensagens antigas em resumo")
+        return dropped, updates
+
+    def _summary_prompt(self, state: AgentState, dropped: List[BaseMessage]) -> List[BaseMessage]:
+        return [
+            SystemMessage(content=(
+                "Summarize the conversation below in a few sentences for an assistant that will continue it. "
+                "Keep facts found in the internal docs and the user's open questions."
+            )),
+            HumanMessage(content=(
+                f"Previous summary: {state.get('summary') or 'none'}\n\n"
+                f"Conversation:\n{get_buffer_string(dropped)}"
+            )),
+        ]
+
+    def _decision(self, response):
         if response.tool_calls:
             print(f"👉 [Decisão] O Agente decidiu USAR FERRAMENTA!")
             for tool in response.tool_calls:
@@ -84,23 +262,27 @@ class AgentOrchestrator:
         return {"messages": [response]}
 
 # --- Construção do Grafo (Infrastructure) ---
-def create_agent_graph(orchestrator):
+def create_agent_graph(orchestrator, checkpointer: BaseCheckpointSaver):
     workflow = StateGraph(AgentState)
 
     # Definimos os nós (as funções que criamos)
-    workflow.add_node("agent", orchestrator.call_model)
+    # Sync e async: com app.astream, o ToolNode roda as tool calls de uma rodada em paralelo
+    workflow.add_node("compact", RunnableLambda(orchestrator.compact_history, afunc=orchestrator.acompact_history))
+    workflow.add_node("agent", RunnableLambda(orchestrator.call_model, afunc=orchestrator.acall_model))
     workflow.add_node("tools", ToolNode(tools=orchestrator.tools))
 
     # Definimos as arestas (fluxo de execução)
-    workflow.set_entry_point("agent")
+    # A compactação roda uma vez por pergunta; o loop agent <-> tools não passa por ela
+    workflow.set_entry_point("compact")
+    workflow.add_edge("compact", "agent")
     
     # O conditional edge lê o output do 'agent' e decide para onde ir
     workflow.add_conditional_edges("agent", tools_condition)
     workflow.add_edge("tools", "agent")
 
-    memory = MemorySaver()
-
-    return workflow.compile(checkpointer=memory)
+    # Checkpointer obrigatório: sem padrão em memória, que crescia sem limite a cada thread.
+    # Em produção, BoundedSqliteSaver (checkpointer.py); um MemorySaver só se passado de propósito
+    return workflow.compile(checkpointer=checkpointer)
 
 # --- Execução do Desafio ---
 if __name__ == "__main__":
@@ -114,27 +296,43 @@ if __name__ == "__main__":
     ]
 
     platform.create_collection("startup_docs")
-    platform.ingest("startup_docs", documents)
+    platform.ingest("startup_docs", documents, metadata={"tenant": "lucas", "source": "handbook"})
 
-    search_tool = StartupSearchTool(platform=platform)
+    search_tool = StartupSearchTool(platform=platform, filters={"tenant": "lucas"})
 
 
     orchestrator = AgentOrchestrator(tools=[search_tool])
 
 
-    app = create_agent_graph(orchestrator)
-
     random_id = str(uuid.uuid4())[:8]
     config = {"configurable": {"thread_id": f"lucas_{random_id}" }}
     
-    print("--- Primeira interação ---")
-    inputs = {"messages": [HumanMessage(content="What is our policy for Sunday server restarts?")]}
-    for output in app.stream(inputs, config=config):
-        print(output)
-
-    print("--- Segunda interação ---")
-    inputs = {"messages": [HumanMessage(content="What is sunday restart policy again?")]}
-    for output in app.stream(inputs, config=config):
-        print(output)
+    async def chat():
+        # Import tardio: aiosqlite e langgraph-checkpoint-sqlite só são exigidos aqui, não de
+        # quem importa o módulo e passa o próprio checkpointer
+        from ai_platform_labs.internal_search_agent.checkpointer import BoundedSqliteSaver
+
+        # Histórico em SQLite local: threads inativas por uma semana, ou além das 1000 mais
+        # recentes, são apagadas. Um único event loop para as duas interações (o cliente
+        # async da OpenAI fica preso ao loop)
+        async with BoundedSqliteSaver.from_path("agent_memory.db", ttl=7 * 24 * 3600, max_threads=1000) as memory:
+            app = create_agent_graph(orchestrator, checkpointer=memory)
+
+            # Um Tracer por interação: spans em agent_traces.jsonl e relatório por etapa no fim
+            print("--- Primeira interação ---")
+            tracer = Tracer(path="agent_traces.jsonl")
+            inputs = {"messages": [HumanMessage(content="What is our policy for Sunday server restarts?")]}
+            async for output in app.astream(inputs, config={**config, "callbacks": [tracer]}):
+                print(output)
+            print(tracer.format_report())
+
+            print("--- Segunda interação ---")
+            tracer = Tracer(path="agent_traces.jsonl")
+            inputs = {"messages": [HumanMessage(content="What is sunday restart policy again?")]}
+            async for output in app.astream(inputs, config={**config, "callbacks": [tracer]}):
+                print(output)
+            print(tracer.format_report())
+
+    asyncio.run(chat())
 
     time.sleep(2)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# Requer: pip install langgraph-checkpoint-sqlite
+
+
+class BoundedSqliteSaver(AsyncSqliteSaver):
+    """
+    Checkpointer do LangGraph em SQLite local, com limite de memória em disco:
+
+    - cada escrita marca o thread_id como ativo (tabela `thread_activity`);
+    - threads sem atividade há mais de `ttl` segundos são apagadas;
+    - acima de `max_threads`, saem as inativas há mais tempo.
+
+    A limpeza roda a cada `prune_every` checkpoints gravados, não a cada passo.
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        ttl: float = 7 * 24 * 3600,
+        max_threads: int = 1000,
+        prune_every: int = 50,
+    ):
+        super().__init__(conn)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.prune_every = prune_every
+        self._writes_since_prune = 0
+
+    @classmethod
+    @asynccontextmanager
+    async def from_path(cls, path: str, **options) -> AsyncIterator["BoundedSqliteSaver"]:
+        async with aiosqlite.connect(path) as conn:
+            yield cls(conn, **options)
+
+    async def setup(self) -> None:
+        if self.is_setup:
+            return
+        await super().setup()
+        await self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_seen REAL)"
+        )
+        await self.conn.commit()
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        # Mesmo lock do saver: a conexão é compartilhada com as escritas dos checkpoints
+        async with self.lock:
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO thread_activity VALUES (?, ?)",
+                (str(config["configurable"]["thread_id"]), time.time()),
+            )
+            await self.conn.commit()
+
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= self.prune_every:
+            self._writes_since_prune = 0
+            await self.prune()
+        return next_config
+
+    async def prune(self, now: Optional[float] = None) -> List[str]:
+        """Apaga threads expiradas ou excedentes e devolve os ids removidos."""
+        await self.setup()
+        now = now or time.time()
+        async with self.lock:
+            async with self.conn.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_seen < ?", (now - self.ttl,)
+            ) as cursor:
+                expired = [row[0] for row in await cursor.fetchall()]
+            async with self.conn.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_seen >= ? ORDER BY last_seen DESC LIMIT -1 OFFSET ?",
+                (now - self.ttl, self.max_threads),
+            ) as cursor:
+                excess = [row[0] for row in await cursor.fetchall()]
+
+        removed = expired + excess
+        for thread_id in removed:
+            await self.adelete_thread(thread_id)
+        if removed:
+            async with self.lock:
+                await self.conn.executemany("DELETE FROM thread_activity WHERE thread_id = ?", [(t,) for t in removed])
+                await self.conn.commit()
+        return removed
@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler, Callbacks
+from langchain_core.callbacks.manager import adispatch_custom_event, dispatch_custom_event
+
+# Evento que tools disparam quando a resposta veio de um cache
+CACHE_HIT_EVENT = "cache_hit"
+
+
+# As tools devem passar os callbacks do próprio run (run_manager.get_child(), ou o parâmetro
+# `callbacks` de uma @tool), não o config injetado: esse é o do nó pai, e o hit cairia no
+# span do nó em vez do span da tool.
+async def adispatch_cache_hit(tier: str, callbacks: Callbacks):
+    if callbacks is not None:
+        await adispatch_custom_event(CACHE_HIT_EVENT, {"tier": tier}, config={"callbacks": callbacks})
+
+
+def dispatch_cache_hit(tier: str, callbacks: Callbacks):
+    if callbacks is not None:
+        dispatch_custom_event(CACHE_HIT_EVENT, {"tier": tier}, config={"callbacks": callbacks})
+
+
+class Tracer(BaseCallbackHandler):
+    """
+    Callback do LangChain que transforma uma execução de grafo do LangGraph em spans:
+
+    - `workflow`: o grafo inteiro (run raiz);
+    - `node`: cada nó do grafo (agent, tools, ...);
+    - `llm`: cada chamada de modelo, com tokens de prompt/resposta e tokens lidos do
+      cache de prompt do provedor;
+    - `tool`: cada tool call, marcada com `cache_hit` se a tool chamar
+      `adispatch_cache_hit`/`dispatch_cache_hit`.
+
+    Uso: `graph.astream_events(state, config={"callbacks": [tracer]})`. Com `path`, os
+    spans são gravados em JSON lines ao fim do workflow; `report()` agrega por etapa.
+    """
+
+    # Roda no próprio event loop/thread da execução, sem executor: cada callback é barato
+    run_inline = True
+
+    def __init__(self, trace_id: Optional[str] = None, path: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.path = path
+        self.spans: List[Dict[str, Any]] = []
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+        # Pai de todo run visto (inclusive os que não viram span), para ligar cada span
+        # ao span rastreado mais próximo
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self._lock = threading.Lock()
+
+    # --- Abertura e fechamento de spans ---
+
+    def _start(self, kind: str, name: str, run_id: UUID, parent_run_id: Optional[UUID]):
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            parent = parent_run_id
+            while parent is not None and parent not in self._open:
+                parent = self._parents.get(parent)
+            self._open[run_id] = {
+                "trace_id": self.trace_id,
+                "span_id": str(run_id),
+                "parent_id": str(parent) if parent else None,
+                "kind": kind,
+                "name": name,
+                "start": time.time(),
+                "_perf": time.perf_counter(),
+            }
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **fields) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            span = self._open.pop(run_id, None)
+            if span is None:
+                return None
+            span["end"] = time.time()
+            span["duration_ms"] = (time.perf_counter() - span.pop("_perf")) * 1000
+            span.update(fields)
+            if error is not None:
+                span["error"] = repr(error)
+            self.spans.append(span)
+        if span["kind"] == "workflow":
+            self._export()
+        return span
+
+    # --- Grafo e nós ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        if parent_run_id is None:
+            self._start("workflow", name, run_id, None)
+        elif (metadata or {}).get("langgraph_node") == name:
+            self._start("node", name, run_id, parent_run_id)
+        else:
+            # Runnables internos dos nós não viram span, mas entram na árvore de pais
+            with self._lock:
+                self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # --- LLM ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", kwargs.get("name") or (serialized or {}).get("name", "chat_model"), run_id, parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", kwargs.get("name") or (serialized or {}).get("name", "llm"), run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, **_token_usage(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # --- Tools ---
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start("tool", kwargs.get("name") or (serialized or {}).get("name", "tool"), run_id, parent_run_id)
+        self._open[run_id]["cache_hit"] = False
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name == CACHE_HIT_EVENT and run_id in self._open:
+            self._open[run_id]["cache_hit"] = True
+            if isinstance(data, dict) and data.get("tier"):
+                self._open[run_id]["cache_tier"] = data["tier"]
+
+    # --- Saída ---
+
+    def _export(self):
+        if not self.path:
+            return
+        with self._lock, open(self.path, "a") as f:
+            for span in self.spans:
+                f.write(json.dumps(span, default=str) + "\n")
+
+    def report(self) -> Dict[str, Any]:
+        """Agrega os spans por (tipo, nome): chamadas, tempo total/máximo, % do workflow e tokens."""
+        workflow = next((s for s in self.spans if s["kind"] == "workflow"), None)
+        total_ms = workflow["duration_ms"] if workflow else sum(s["duration_ms"] for s in self.spans)
+        groups: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0, "cache_hits": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0,
+        })
+        for span in self.spans:
+            if span["kind"] == "workflow":
+                continue
+            group = groups[f"{span['kind']}:{span['name']}"]
+            group["calls"] += 1
+            group["total_ms"] += span["duration_ms"]
+            group["max_ms"] = max(group["max_ms"], span["duration_ms"])
+            group["errors"] += "error" in span
+            group["cache_hits"] += bool(span.get("cache_hit"))
+            for key in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens"):
+                group[key] += span.get(key, 0)
+        for group in groups.values():
+            group["share"] = group["total_ms"] / total_ms if total_ms else 0.0
+
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": total_ms,
+            # Ordenado pelo que mais pesa na latência ponta a ponta
+            "steps": dict(sorted(groups.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+        }
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = [f"--- Trace {report['trace_id']} ({report['total_ms']:.0f} ms) ---"]
+        for step, g in report["steps"].items():
+            lines.append(
+                f"{step:<32} {g['calls']:>3}x  {g['total_ms']:>8.0f} ms  {g['share']:>6.1%}  "
+                f"tokens {g['prompt_tokens']}/{g['completion_tokens']} (cache {g['cached_prompt_tokens']})  "
+                f"cache hits {g['cache_hits']}"
+            )
+        return "\n".join(lines)
+
+
+def _token_usage(response) -> Dict[str, int]:
+    # usage_metadata da mensagem (também presente em streaming com stream_usage=True);
+    # senão, o token_usage do llm_output da OpenAI
+    prompt = completion = cached = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+                cached += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    if not (prompt or completion):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "cached_prompt_tokens": cached}
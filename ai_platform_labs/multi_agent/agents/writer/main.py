@@ -1,9 +1,15 @@
+import asyncio
+import json
 import os
+import time
+from typing import AsyncIterator, List, Optional, Tuple
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from response_cache import ResponseCache, exact_key
 
 app = FastAPI(title="Writer Agent")
 
@@ -11,43 +17,139 @@ app = FastAPI(title="Writer Agent")
 # Se não tiver chave, usamos um mock simples para o lab não quebrar
 api_key = os.getenv("OPENAI_API_KEY")
 
+MODEL = "gpt-3.5-turbo"
+TEMPERATURE = 0.7
+
 if api_key:
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.7)
+    llm = ChatOpenAI(model=MODEL, temperature=TEMPERATURE)
+    # Embeddings para o nível semântico do cache de respostas
+    embeddings = OpenAIEmbeddings(model=os.getenv("WRITER_EMBEDDING_MODEL", "text-embedding-3-small"))
 else:
     print("Warning: OPENAI_API_KEY not found. Using Mock LLM.")
     llm = None
+    embeddings = None
+
+# Cache de respostas: hit exato (mesmo prompt, modelo e temperatura) ou semântico
+# (pedido parecido escrito há pouco). WRITER_CACHE_PATH guarda em disco (SQLite).
+cache = ResponseCache(
+    maxsize=int(os.getenv("WRITER_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("WRITER_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("WRITER_CACHE_SIMILARITY", "0.95")),
+    path=os.getenv("WRITER_CACHE_PATH"),
+)
+CACHE_NAMESPACE = f"{MODEL}:{TEMPERATURE}" if llm else "mock"
+
+# Prompt Template
+prompt = ChatPromptTemplate.from_template(
+    """You are a professional technical writer.
+    Write a concise summary paragraph about the following topic: {topic}.
+    
+    Use the following context gathered by the researcher:
+    {context}
+    
+    If the context is not relevant, mention that you are writing based on general knowledge.
+    """
+)
 
 class WriteRequest(BaseModel):
     topic: str
     context: str
+    # stream=True responde em server-sent events, token a token
+    stream: bool = False
+
+def mock_content(request: WriteRequest) -> str:
+    # Mock Response se não houver API Key
+    return (f"[MOCK GENERATION] Here is a report about {request.topic}. "
+            f"Context used: {request.context[:50]}...")
+
+async def generate_tokens(request: WriteRequest) -> AsyncIterator[str]:
+    if not llm:
+        for word in mock_content(request).split(" "):
+            yield word + " "
+            await asyncio.sleep(0)
+        return
+
+    chain = prompt | llm | StrOutputParser()
+    async for token in chain.astream({"topic": request.topic, "context": request.context}):
+        yield token
+
+async def cache_lookup(request: WriteRequest) -> Tuple[str, Optional[List[float]], Optional[str], Optional[str]]:
+    # Devolve (chave exata, embedding do pedido, conteúdo em cache, nível do hit)
+    rendered = prompt.format(topic=request.topic, context=request.context)
+    key = exact_key(rendered, MODEL if llm else "mock", TEMPERATURE)
+    content = cache.get_exact(key)
+    if content is not None:
+        return key, None, content, "exact"
+    if embeddings is None:
+        return key, None, None, None
+
+    try:
+        embedding = await embeddings.aembed_query(f"{request.topic}\n{request.context}")
+    except Exception as e:
+        print(f"[Writer] Semantic cache skipped: {e}")
+        return key, None, None, None
+    content = cache.get_similar(CACHE_NAMESPACE, embedding)
+    return key, embedding, content, "semantic" if content is not None else None
+
+def sse(event: dict) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+async def stream_content(request: WriteRequest) -> AsyncIterator[str]:
+    # Mesmas métricas do ai_infra_labs/model_serving/llm_metrics_testing.py, do lado do servidor
+    start_time = time.time()
+    key, embedding, cached, tier = await cache_lookup(request)
+    if cached is not None:
+        print(f"[Writer] Cache hit ({tier}) for '{request.topic}'")
+        yield sse({"type": "token", "token": cached})
+        yield sse({"type": "done", "content": cached, "cache": tier,
+                   "ttft_ms": (time.time() - start_time) * 1000, "tpot_ms": None})
+        return
+
+    first_token_time = None
+    tokens_count = 0
+    parts = []
+
+    try:
+        async for token in generate_tokens(request):
+            if first_token_time is None:
+                first_token_time = time.time() # TTFT capturado aqui
+            tokens_count += 1
+            parts.append(token)
+            yield sse({"type": "token", "token": token})
+    except Exception as e:
+        yield sse({"type": "error", "error": str(e)})
+        return
+
+    total_time = time.time() - start_time
+    ttft = (first_token_time - start_time) * 1000 if first_token_time else None
+    tpot = (total_time / tokens_count) * 1000 if tokens_count > 0 else None
+    content = "".join(parts)
+    cache.set(key, CACHE_NAMESPACE, content, embedding)
+    print(f"[Writer] Streamed '{request.topic}': {tokens_count} tokens | TTFT: {ttft} ms | TPOT: {tpot} ms")
+    yield sse({"type": "done", "content": content, "ttft_ms": ttft, "tpot_ms": tpot})
 
 @app.post("/write")
 async def write_content(request: WriteRequest):
     print(f"[Writer] Escrevendo sobre: {request.topic}")
+
+    if request.stream:
+        return StreamingResponse(stream_content(request), media_type="text/event-stream")
+
+    key, embedding, cached, tier = await cache_lookup(request)
+    if cached is not None:
+        print(f"[Writer] Cache hit ({tier}) for '{request.topic}'")
+        return {"content": cached, "cache": tier}
     
     if not llm:
-        # Mock Response se não houver API Key
-        return {
-            "content": f"[MOCK GENERATION] Here is a report about {request.topic}. "
-                       f"Context used: {request.context[:50]}..."
-        }
-
-    # Prompt Template
-    prompt = ChatPromptTemplate.from_template(
-        """You are a professional technical writer.
-        Write a concise summary paragraph about the following topic: {topic}.
-        
-        Use the following context gathered by the researcher:
-        {context}
-        
-        If the context is not relevant, mention that you are writing based on general knowledge.
-        """
-    )
+        content = mock_content(request)
+        cache.set(key, CACHE_NAMESPACE, content, embedding)
+        return {"content": content}
 
     chain = prompt | llm | StrOutputParser()
     
     try:
         result = await chain.ainvoke({"topic": request.topic, "context": request.context})
+        cache.set(key, CACHE_NAMESPACE, result, embedding)
         
         print(f"\n[Writer] --- Generated Content for '{request.topic}' ---\n{result}\n------------------------------------------")
         
@@ -55,6 +157,10 @@ async def write_content(request: WriteRequest):
     except Exception as e:
         return {"content": f"Error generating text: {str(e)}"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
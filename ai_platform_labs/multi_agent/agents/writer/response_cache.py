@@ -0,0 +1,178 @@
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def exact_key(prompt: str, model: str, temperature: float) -> str:
+    return hashlib.sha256(json.dumps([prompt, model, temperature]).encode("utf-8")).hexdigest()
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) + 1e-12)
+
+
+class ResponseCache:
+    """
+    Cache de respostas do LLM em dois níveis:
+
+    - exato: chave = hash do prompt renderizado + modelo + temperatura;
+    - semântico: se nada bate exatamente, reaproveita a resposta cujo embedding da
+      requisição tem similaridade de cosseno >= `similarity_threshold` (mesmo modelo e
+      temperatura).
+
+    Entradas expiram após `ttl` segundos e, acima de `maxsize`, sai a usada há mais tempo.
+    Com `path`, as entradas também ficam num SQLite local e sobrevivem a restarts; as
+    escritas no SQLite rodam numa thread própria, fora do event loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        ttl: float = 3600.0,
+        similarity_threshold: float = 0.95,
+        path: Optional[str] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Matriz de embeddings normalizados por namespace, refeita só quando as entradas mudam
+        self._matrices: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        self.hits = {"exact": 0, "semantic": 0}
+        self.lookups = 0
+        self._db = None
+        self._db_writer: Optional[ThreadPoolExecutor] = None
+        if path:
+            # Uma única thread usa a conexão depois do _load: as escritas saem em ordem
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response_cache_db")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, namespace TEXT, content TEXT, embedding TEXT, created_at REAL)"
+            )
+            self._load()
+
+    def _load(self):
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        # Linhas além das `maxsize` mais novas nunca voltariam para a memória
+        self._db.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+            (self.maxsize,),
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT key, namespace, content, embedding, created_at FROM responses ORDER BY created_at DESC LIMIT ?",
+            (self.maxsize,),
+        ).fetchall()
+        for key, namespace, content, embedding, created_at in reversed(rows):
+            self._entries[key] = {
+                "namespace": namespace,
+                "content": content,
+                "embedding": _unit(json.loads(embedding)) if embedding else None,
+                "created_at": created_at,
+            }
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] > self.ttl
+
+    def _delete(self, keys: List[str]):
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._matrices.pop(entry["namespace"], None)
+        if keys:
+            self._write("DELETE FROM responses WHERE key = ?", [(key,) for key in keys])
+
+    def _write(self, statement: str, rows: List[tuple]):
+        if self._db_writer is None:
+            return
+
+        def write():
+            self._db.executemany(statement, rows)
+            self._db.commit()
+
+        self._db_writer.submit(write)
+
+    def flush(self):
+        # Espera as escritas pendentes no SQLite (ex. no shutdown)
+        if self._db_writer is not None:
+            self._db_writer.submit(lambda: None).result()
+
+    def get_exact(self, key: str) -> Optional[str]:
+        # Toda consulta começa aqui; o embedding só é calculado se este nível errar
+        self.lookups += 1
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            self._delete([key])
+            entry = None
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        self.hits["exact"] += 1
+        return entry["content"]
+
+    def get_similar(self, namespace: str, embedding: List[float]) -> Optional[str]:
+        match = self._nearest(namespace, _unit(embedding))
+        if match is None:
+            return None
+        self._entries.move_to_end(match)
+        self.hits["semantic"] += 1
+        return self._entries[match]["content"]
+
+    def _nearest(self, namespace: str, query: np.ndarray) -> Optional[str]:
+        while True:
+            if namespace not in self._matrices:
+                candidates = [
+                    (key, entry["embedding"]) for key, entry in self._entries.items()
+                    if entry["namespace"] == namespace and entry["embedding"] is not None
+                ]
+                if not candidates:
+                    return None
+                keys, vectors = zip(*candidates)
+                self._matrices[namespace] = (list(keys), np.stack(vectors))
+            keys, matrix = self._matrices[namespace]
+            # Vetores já normalizados: o produto escalar é a similaridade de cosseno
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+            # Expiração só é checada no vencedor; expirado, sai e a busca refaz a matriz
+            if not self._expired(self._entries[keys[best]]):
+                return keys[best]
+            self._delete([keys[best]])
+
+    def set(self, key: str, namespace: str, content: str, embedding: Optional[List[float]] = None):
+        entry = {
+            "namespace": namespace,
+            "content": content,
+            "embedding": _unit(embedding) if embedding is not None else None,
+            "created_at": time.time(),
+        }
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._matrices.pop(namespace, None)
+        self._write(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            [(key, namespace, content, json.dumps(embedding) if embedding is not None else None, entry["created_at"])],
+        )
+        # Acima de maxsize, as menos usadas saem da memória e do SQLite
+        if len(self._entries) > self.maxsize:
+            self._delete(list(self._entries)[:len(self._entries) - self.maxsize])
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.hits["exact"] + self.hits["semantic"]
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": dict(self.hits),
+            "misses": self.lookups - hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+        }
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Tuple
+
+
+class SearchBatcher:
+    """
+    Coalesces concurrent /search calls into a single batch_hybrid_search call.
+
+    Requests wait at most `max_wait_ms` for company; while a batch is running on the
+    executor, new requests keep queueing up and form the next (larger) batch, so the
+    event loop never blocks on encoding or reranking.
+    """
+
+    def __init__(self, platform, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.platform = platform
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # One worker thread: the models already use intra-op parallelism
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-batch")
+        self.queue: "asyncio.Queue[Tuple[str, str, Dict[str, Any], asyncio.Future]]" = None
+        self._task = None
+
+    def start(self):
+        # Created here so the queue binds to the server's running loop (Python 3.9)
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    async def search(self, query: str, collection: str, **options):
+        # `options` are batch_hybrid_search's settings (depths, budgets, filters);
+        # only requests with identical settings are batched together
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, collection, options, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, str, Dict[str, Any], asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+
+            # Options may hold lists/dicts (collections, filters), so the group key is their JSON
+            groups = defaultdict(list)
+            settings = {}
+            for query, collection, options, future in batch:
+                key = json.dumps([collection, options], sort_keys=True)
+                settings[key] = (collection, options)
+                groups[key].append((query, future))
+
+            for key, items in groups.items():
+                collection, options = settings[key]
+                queries = [query for query, _ in items]
+                search = partial(self.platform.batch_hybrid_search, queries, collection, **options)
+                try:
+                    results = await loop.run_in_executor(self.executor, search)
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (_, future), result in zip(items, results):
+                    if not future.done():
+                        future.set_result(result)
@@ -0,0 +1,171 @@
+import hashlib
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class Chunk(NamedTuple):
+    text: str
+    parent_id: str
+    chunk_index: int
+
+
+class NearDuplicateFilter:
+    """
+    Detecta chunks quase idênticos com SimHash de 64 bits.
+
+    O hash é dividido em 4 bandas de 16 bits: dois chunks a até 3 bits de distância
+    compartilham pelo menos uma banda, então só comparamos contra esses candidatos.
+    """
+
+    BANDS = 4
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(self.BANDS)]
+
+    @staticmethod
+    def simhash(text: str) -> int:
+        words = WORD_PATTERN.findall(text.lower())
+        # Shingles de 2 palavras: sensível à ordem, tolerante a pequenas edições
+        features = [" ".join(words[i:i + 2]) for i in range(max(1, len(words) - 1))]
+        weights = [0] * 64
+        for feature in features:
+            h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            for bit in range(64):
+                weights[bit] += 1 if h >> bit & 1 else -1
+        return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+    def seen(self, text: str) -> bool:
+        fingerprint = self.simhash(text)
+        bands = [(fingerprint >> (16 * i)) & 0xFFFF for i in range(self.BANDS)]
+
+        for table, band in zip(self._bands, bands):
+            for candidate in table.get(band, ()):
+                if bin(candidate ^ fingerprint).count("1") <= self.max_distance:
+                    return True
+
+        for table, band in zip(self._bands, bands):
+            table.setdefault(band, []).append(fingerprint)
+        return False
+
+
+class Chunker:
+    """
+    Quebra documentos em chunks de até `max_tokens` tokens do modelo denso, com
+    `overlap_tokens` de sobreposição, antes da ingestão.
+
+    O MiniLM trunca tudo depois de 256 tokens: sem isso, o fim de documentos longos
+    nunca era encontrado e ainda pagávamos para tokenizar o texto descartado.
+    """
+
+    def __init__(
+        self,
+        tokenizer=None,
+        max_tokens: int = 200,
+        overlap_tokens: int = 40,
+        dedupe: bool = True,
+    ):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.dedupe = dedupe
+        self._count_tokens: Callable[[str], int] = (
+            (lambda text: len(tokenizer.tokenize(text))) if tokenizer is not None
+            else (lambda text: len(text.split()))
+        )
+
+    def _sentences(self, text: str) -> Iterator[Tuple[str, int]]:
+        for sentence in SENTENCE_PATTERN.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            tokens = self._count_tokens(sentence)
+            if tokens <= self.max_tokens:
+                yield sentence, tokens
+                continue
+            # Frase maior que o chunk: corta por palavras na proporção de tokens, em pedaços
+            # de max_tokens - overlap_tokens, para sobrar espaço para a sobreposição entre eles
+            budget = max(1, self.max_tokens - self.overlap_tokens)
+            words = sentence.split()
+            step = max(1, len(words) * budget // tokens)
+            for start in range(0, len(words), step):
+                piece = " ".join(words[start:start + step])
+                yield piece, self._count_tokens(piece)
+
+    def _tail(self, sentence: str, tokens: int, budget: int) -> Optional[Tuple[str, int]]:
+        # As últimas palavras da frase que somam no máximo `budget` tokens
+        words = sentence.split()
+        count = max(1, len(words) * budget // tokens)
+        piece = " ".join(words[-count:])
+        piece_tokens = self._count_tokens(piece)
+        while piece_tokens > budget and count > 1:
+            count -= 1
+            piece = " ".join(words[-count:])
+            piece_tokens = self._count_tokens(piece)
+        while count < len(words):
+            longer = " ".join(words[-(count + 1):])
+            longer_tokens = self._count_tokens(longer)
+            if longer_tokens > budget:
+                break
+            count, piece, piece_tokens = count + 1, longer, longer_tokens
+        return (piece, piece_tokens) if piece_tokens <= budget else None
+
+    def chunk_text(self, text: str) -> Iterator[str]:
+        window: List[Tuple[str, int]] = []
+        window_tokens = 0
+
+        for sentence, tokens in self._sentences(text):
+            if window and window_tokens + tokens > self.max_tokens:
+                yield " ".join(s for s, _ in window)
+                # Mantém as últimas frases (até overlap_tokens) como contexto do próximo chunk
+                overlap: List[Tuple[str, int]] = []
+                overlap_size = 0
+                for s, t in reversed(window):
+                    if overlap_size + t > self.overlap_tokens:
+                        break
+                    overlap.insert(0, (s, t))
+                    overlap_size += t
+                # Última frase maior que a sobreposição: usa o final dela, por palavras
+                if not overlap and self.overlap_tokens > 0:
+                    tail = self._tail(*window[-1], self.overlap_tokens)
+                    if tail is not None:
+                        overlap, overlap_size = [tail], tail[1]
+                # ...sem deixar a sobreposição empurrar o próximo chunk além do limite
+                while overlap and overlap_size + tokens > self.max_tokens:
+                    overlap_size -= overlap.pop(0)[1]
+                window, window_tokens = overlap, overlap_size
+            window.append((sentence, tokens))
+            window_tokens += tokens
+
+        if window:
+            yield " ".join(s for s, _ in window)
+
+    def split(self, documents: Iterable[Union[str, Tuple[str, str]]]) -> Iterator[Chunk]:
+        # Aceita textos soltos ou pares (parent_id, texto) e funciona em streaming
+        duplicates = NearDuplicateFilter() if self.dedupe else None
+        for document in documents:
+            if isinstance(document, str):
+                parent_id, text = hashlib.sha1(document.encode("utf-8")).hexdigest(), document
+            else:
+                parent_id, text = document
+
+            for index, chunk in enumerate(self.chunk_text(text)):
+                if duplicates is not None and duplicates.seen(chunk):
+                    continue
+                yield Chunk(text=chunk, parent_id=parent_id, chunk_index=index)
+
+
+def collapse_chunks(results: List[Tuple], top_k: Optional[int] = None) -> List[Tuple]:
+    # Mantém só o melhor chunk de cada documento (a lista já vem ordenada por score).
+    # Na busca federada, o mesmo id em coleções diferentes é outro documento.
+    seen = set()
+    collapsed = []
+    for point, score in results:
+        parent = (point.payload.get("collection"), point.payload.get("parent_id", point.id))
+        if parent in seen:
+            continue
+        seen.add(parent)
+        collapsed.append((point, score))
+    return collapsed[:top_k] if top_k is not None else collapsed
@@ -1,39 +1,118 @@
-from fastapi import FastAPI
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
-from hybrid_search import RetrievalPlatform
-
-app = FastAPI(title="Researcher Service")
+import model_registry
+from batcher import SearchBatcher
+from hybrid_search import RetrievalPlatform, documents_hash
 
 # Initialize Search Engine
-platform = RetrievalPlatform()
+# QDRANT_PATH enables the on-disk store: restarts reuse the stored vectors instead of re-embedding
+STORAGE_PATH = os.getenv("QDRANT_PATH")
+KNOWLEDGE_BASE_FILE = os.getenv("KNOWLEDGE_BASE_FILE")
+COLLECTION_NAME = "knowledge_base"
+
+# RETRIEVAL_BACKEND=onnx serves the int8 models exported by hybrid_search/export_onnx.py
+platform = RetrievalPlatform(
+    path=STORAGE_PATH,
+    backend=os.getenv("RETRIEVAL_BACKEND", "torch"),
+    onnx_dir=os.getenv("ONNX_MODEL_DIR"),
+    onnx_threads=int(os.getenv("ONNX_INTRA_OP_THREADS", "0")) or None,
+)
+
+DEFAULT_DOCS = [
+    "Artificial Intelligence in 2025 is focused on agentic workflows where LLMs can take actions.",
+    "The best way to cook pasta is to salt the water heavily, like the ocean.",
+    "Docker Compose allows you to define and run multi-container Docker applications.",
+    "LangGraph is a library for building stateful, multi-actor applications with LLMs.",
+    "Python 3.11 introduced significant performance improvements over previous versions.",
+    "Multi-agent systems consist of autonomous agents interacting to solve complex problems."
+]
+
+def load_documents():
+    # One document per line; falls back to the dummy data when no file is configured
+    if not KNOWLEDGE_BASE_FILE:
+        return DEFAULT_DOCS
+    with open(KNOWLEDGE_BASE_FILE) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def chunk_documents(docs):
+    # Long documents are split into overlapping chunks that fit the encoder window
+    return platform.chunker(max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "200"))).split(docs)
+
+# Set once the models are loaded and the knowledge base is populated (see /ready)
+knowledge_base_ready = threading.Event()
 
 # Populate with dummy data on startup
 def populate_knowledge_base():
     print("[Researcher] Initializing knowledge base...")
-    collection_name = "knowledge_base"
-    platform.create_collection(collection_name)
-    
-    docs = [
-        "Artificial Intelligence in 2025 is focused on agentic workflows where LLMs can take actions.",
-        "The best way to cook pasta is to salt the water heavily, like the ocean.",
-        "Docker Compose allows you to define and run multi-container Docker applications.",
-        "LangGraph is a library for building stateful, multi-actor applications with LLMs.",
-        "Python 3.11 introduced significant performance improvements over previous versions.",
-        "Multi-agent systems consist of autonomous agents interacting to solve complex problems."
-    ]
-    
-    platform.ingest(collection_name, docs)
+    docs = load_documents()
+    content_hash = documents_hash(docs)
+
+    if platform.stored_content_hash(COLLECTION_NAME) == content_hash:
+        print("[Researcher] Knowledge base unchanged, skipping ingestion (warm start).")
+        # Nothing to embed, but the first search should not pay for loading the models
+        platform.warm_up()
+    elif platform.client.collection_exists(collection_name=COLLECTION_NAME):
+        platform.reindex(COLLECTION_NAME, chunk_documents(docs), content_hash)
+    else:
+        platform.create_collection(COLLECTION_NAME)
+        platform.ingest(COLLECTION_NAME, chunk_documents(docs))
+        platform.set_content_hash(COLLECTION_NAME, content_hash)
 
-populate_knowledge_base()
+    knowledge_base_ready.set()
+    print("[Researcher] Knowledge base ready.")
+
+def reindex_knowledge_base():
+    # Reading, chunking (which needs the tokenizer, loaded lazily) and embedding all stay
+    # off the event loop, so /health and /ready keep answering during a reindex
+    docs = load_documents()
+    return platform.reindex(COLLECTION_NAME, chunk_documents(docs), documents_hash(docs))
+
+# Micro-batching: concurrent /search calls share one encode + one rerank call
+batcher = SearchBatcher(
+    platform,
+    max_batch_size=int(os.getenv("SEARCH_MAX_BATCH", "32")),
+    max_wait_ms=float(os.getenv("SEARCH_BATCH_WINDOW_MS", "5")),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    batcher.start()
+    # Models are loaded and the knowledge base populated in the background, so /health
+    # answers right away. It runs on the batcher's thread: early searches queue behind it.
+    loop = asyncio.get_running_loop()
+    app.state.startup = loop.run_in_executor(batcher.executor, populate_knowledge_base)
+    yield
+    await batcher.stop()
+
+app = FastAPI(title="Researcher Service", lifespan=lifespan)
 
 class Query(BaseModel):
     text: str
+    # Optional per-request cascade settings (see RetrievalPlatform.batch_hybrid_search)
+    prefetch_limit: Optional[int] = None
+    rerank_depth: Optional[int] = None
+    top_k: Optional[int] = None
+    skip_margin: Optional[float] = None
+    rerank_budget_pairs: Optional[int] = None
+    rerank_budget_ms: Optional[float] = None
+    collapse_by_parent: Optional[bool] = True
+    # Multi-tenant search: payload filters (e.g. {"tenant": "acme", "source": ["wiki"]})
+    # and, for federated search, several collections fused into one result
+    filters: Optional[Dict[str, Any]] = None
+    collections: Optional[List[str]] = None
 
 @app.post("/search")
 async def search(query: Query):
     print(f"[Researcher] Searching for: {query.text}")
     
-    results = platform.hybrid_search(query.text, "knowledge_base")
+    options = query.model_dump(exclude={"text", "collections"}, exclude_none=True)
+    collection = query.collections or COLLECTION_NAME
+    results = await batcher.search(query.text, collection, **options)
     
     if not results:
         return {"results": "No relevant information found."}
@@ -47,6 +126,35 @@ async def search(query: Query):
     
     return {"results": context}
 
+@app.post("/reindex")
+async def reindex():
+    # Explicit incremental re-index: only new/changed documents are embedded.
+    # Runs on the batcher's thread so it never races with in-flight searches.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(batcher.executor, reindex_knowledge_base)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return platform.cache_stats()
+
+@app.get("/models/stats")
+def models_stats():
+    # Load time and memory of each model loaded in this process
+    return model_registry.registry.stats()
+
 @app.get("/health")
 def health():
+    # Liveness only: the process is up, even while the models are still loading
     return {"status": "ok"}
+
+@app.get("/ready")
+def ready(response: Response):
+    # Readiness: models loaded and knowledge base populated
+    startup = getattr(app.state, "startup", None)
+    if startup is not None and startup.done() and startup.exception() is not None:
+        response.status_code = 503
+        return {"status": "failed", "error": str(startup.exception())}
+    if not knowledge_base_ready.is_set():
+        response.status_code = 503
+        return {"status": "starting", "models_loaded": platform.models_loaded}
+    return {"status": "ready", "models_loaded": platform.models_loaded}
@@ -0,0 +1,88 @@
+import json
+import os
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Modelos gerados por export_onnx.py (um diretório por modelo, com tokenizer e config)
+DEFAULT_ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models")
+
+
+def _create_session(model_path: str, intra_op_threads: Optional[int]):
+    # onnxruntime/transformers só são importados quando o backend ONNX é usado
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_threads or os.cpu_count() or 1
+    # Uma requisição por vez por sessão: paralelismo fica dentro do operador
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+
+class _OnnxModel:
+    def __init__(self, model_dir: str, max_length: int, intra_op_threads: Optional[int] = None, quantized: bool = True):
+        from transformers import AutoTokenizer
+
+        filename = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = _create_session(os.path.join(model_dir, filename), intra_op_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _run(self, encoded) -> np.ndarray:
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        return self.session.run(None, feeds)[0]
+
+
+class OnnxDenseEncoder(_OnnxModel):
+    """Substituto do SentenceTransformer: mean pooling + normalização L2 sobre o ONNX."""
+
+    def __init__(self, model_dir: str, intra_op_threads: Optional[int] = None, quantized: bool = True):
+        # all-MiniLM-L6-v2 usa max_seq_length=256 no SentenceTransformer
+        super().__init__(model_dir, max_length=256, intra_op_threads=intra_op_threads, quantized=quantized)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            token_embeddings = self._run(encoded)
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings.append(pooled)
+
+        result = np.concatenate(embeddings) if embeddings else np.zeros((0, 384), dtype=np.float32)
+        return result[0] if single else result
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """Substituto do CrossEncoder.predict com a mesma ativação do modelo original."""
+
+    def __init__(self, model_dir: str, intra_op_threads: Optional[int] = None, quantized: bool = True):
+        super().__init__(model_dir, max_length=512, intra_op_threads=intra_op_threads, quantized=quantized)
+        # Mesma regra do CrossEncoder: 1 label sem ativação configurada -> sigmoid
+        with open(os.path.join(model_dir, "config.json")) as f:
+            config = json.load(f)
+        activation = config.get("sbert_ce_default_activation_function")
+        num_labels = len(config.get("id2label", {"0": "LABEL_0"}))
+        self.apply_sigmoid = num_labels == 1 and (activation is None or activation.endswith("Sigmoid"))
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            encoded = self.tokenizer(
+                [q for q, _ in batch], [p for _, p in batch], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            logits = self._run(encoded)[:, 0]
+            scores.append(1 / (1 + np.exp(-logits)) if self.apply_sigmoid else logits)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
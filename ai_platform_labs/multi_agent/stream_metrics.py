@@ -0,0 +1,52 @@
+import json
+import sys
+import time
+
+import requests
+
+# Mede TTFT/TPOT do workflow completo, do ponto de vista do cliente, como o
+# ai_infra_labs/model_serving/llm_metrics_testing.py faz para o Ollama.
+# Uso: python stream_metrics.py "LangGraph" [http://localhost:8000]
+
+
+def test_workflow_latency(topic, supervisor_url="http://localhost:8000"):
+    start_time = time.time()
+    job = requests.post(f"{supervisor_url}/run", params={"topic": topic}).json()
+
+    first_token_time = None
+    tokens_count = 0
+    final_event = None
+
+    response = requests.get(f"{supervisor_url}/jobs/{job['job_id']}/stream", stream=True)
+
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        event = json.loads(line[len(b"data:"):])
+        if event["type"] == "token":
+            if first_token_time is None:
+                first_token_time = time.time() # TTFT capturado aqui
+            tokens_count += 1
+            print(event["token"], end="", flush=True)
+        elif event["type"] in ("tool_start", "tool_end"):
+            print(f"\n[{event['type']}] {event['tool']}", flush=True)
+        elif event["type"] == "done":
+            final_event = event
+
+    end_time = time.time()
+
+    ttft = (first_token_time - start_time) * 1000 if first_token_time else float("nan")
+    total_time = (end_time - start_time)
+    tpot = (total_time / tokens_count) * 1000 if tokens_count > 0 else float("nan")
+
+    print("\n\n--- Métricas do Workflow ---")
+    print(f"Status: {final_event['status'] if final_event else 'desconhecido'}")
+    print(f"TTFT (Time to First Token): {ttft:.2f} ms")
+    print(f"TPOT (Time Per Output Token): {tpot:.2f} ms")
+    print(f"Tempo total: {total_time:.2f} s ({tokens_count} tokens)")
+
+
+if __name__ == "__main__":
+    topic = sys.argv[1] if len(sys.argv) > 1 else "LangGraph"
+    url = sys.argv[2] if len(sys.argv) > 2 else "http://localhost:8000"
+    test_workflow_latency(topic, url)
@@ -0,0 +1,193 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+
+# Job em execução na task atual: as tools chamadas pelo grafo registram suas etapas nele
+current_job: ContextVar[Optional["Job"]] = ContextVar("current_job", default=None)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, topic: str, options: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.topic = topic
+        # Argumentos extras repassados ao runner (ex. mode)
+        self.options = options or {}
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.stages: Dict[str, float] = defaultdict(float)
+        # Eventos do workflow (tokens, início/fim de tools), lidos por /jobs/{id}/stream
+        self.events: List[Dict[str, Any]] = []
+        self.first_token_at: Optional[float] = None
+        # Relatório do Tracer (tempo e tokens por nó/tool), preenchido ao fim do workflow
+        self.trace: Optional[Dict[str, Any]] = None
+        self._wakeup = asyncio.Event()
+
+    def emit(self, event: Dict[str, Any]):
+        if event.get("type") == "token" and self.first_token_at is None:
+            self.first_token_at = time.time()
+        self.events.append(event)
+        # Acorda quem está esperando e arma um novo Event para o próximo
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Dict[str, Any]]:
+        # Repete os eventos já emitidos e segue os novos até o job terminar
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished_at is not None:
+                return
+            await self._wakeup.wait()
+
+    def to_dict(self) -> Dict[str, Any]:
+        queue_wait = (self.started_at or time.time()) - self.created_at
+        execution = (self.finished_at or time.time()) - self.started_at if self.started_at else None
+        return {
+            "job_id": self.id,
+            "topic": self.topic,
+            "options": self.options,
+            "status": self.status,
+            "queue_wait_seconds": queue_wait,
+            "execution_seconds": execution,
+            "stage_seconds": dict(self.stages),
+            "time_to_first_token_seconds": self.first_token_at - self.created_at if self.first_token_at else None,
+            "error": self.error,
+        }
+
+
+def _percentiles(samples: Deque[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50": ordered[int(0.50 * (len(ordered) - 1))],
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+    }
+
+
+class JobManager:
+    """
+    Executa workflows em segundo plano com no máximo `max_concurrency` ao mesmo tempo.
+
+    Até `max_queue_depth` jobs esperam na fila; além disso, submit() recusa (o endpoint
+    responde 429), então uma rajada de tópicos não vira uma rajada de chamadas ao LLM,
+    ao Researcher e ao Writer.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[..., Awaitable[Any]],
+        max_concurrency: int = 4,
+        max_queue_depth: int = 32,
+        max_finished_jobs: int = 1000,
+        max_samples: int = 1000,
+    ):
+        self.runner = runner
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.queue: "asyncio.Queue[Job]" = None
+        self._workers: List[asyncio.Task] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=max_samples))
+
+    def start(self):
+        # Criados aqui para a fila usar o loop do servidor (Python 3.9)
+        self.queue = asyncio.Queue(maxsize=self.max_queue_depth)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def submit(self, topic: str, **options) -> Job:
+        job = Job(topic, options)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise QueueFullError(f"{self.queue.qsize()} jobs already queued")
+        self.jobs[job.id] = job
+        self.counters["submitted"] += 1
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        # Guarda só os `max_finished_jobs` jobs terminados mais antigos; pendentes nunca saem
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            job.started_at = time.time()
+            job.status = "running"
+            self.samples["queue_wait"].append(job.started_at - job.created_at)
+            token = current_job.set(job)
+            try:
+                job.result = await self.runner(job.topic, **job.options)
+                job.status = "completed"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                current_job.reset(token)
+                job.finished_at = time.time()
+                job.emit({"type": "done", "status": job.status, "result": job.result, "error": job.error})
+                self.counters[job.status] += 1
+                self.samples["execution"].append(job.finished_at - job.started_at)
+                if job.first_token_at is not None:
+                    self.samples["time_to_first_token"].append(job.first_token_at - job.created_at)
+                for stage, seconds in job.stages.items():
+                    self.samples[f"stage:{stage}"].append(seconds)
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "counters": dict(self.counters),
+            "seconds": {name: _percentiles(samples) for name, samples in self.samples.items()},
+        }
+
+
+def emit(event: Dict[str, Any]):
+    # Publica um evento no job atual (sem job, ex. chamada fora de /run, não faz nada)
+    job = current_job.get()
+    if job is not None:
+        job.emit(event)
+
+
+@asynccontextmanager
+async def stage(name: str):
+    # Soma o tempo da etapa no job atual (um job pode chamar a mesma tool mais de uma vez)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        job = current_job.get()
+        if job is not None:
+            job.stages[name] += time.perf_counter() - start
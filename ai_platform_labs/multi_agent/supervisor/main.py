@@ -1,8 +1,13 @@
+import asyncio
+import re
 import httpx
-import redis
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 import json
 import os
 import sys
+import time
+import uuid
 import logging
 
 # Configuração de Logger para garantir output no Docker
@@ -19,76 +24,194 @@ if api_key:
     logger.info(f"Key ends with: ...{api_key[-4:]}")
 logger.info(f"------------------")
 
-from fastapi import FastAPI
-from typing import Annotated, Literal, TypedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Literal, Optional, Tuple, TypedDict
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import Callbacks
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, create_react_agent
 
+from jobs import JobManager, QueueFullError, current_job, emit, stage
+from service_client import CircuitBreaker, CircuitOpenError, HttpPool, ServiceClient
+from tracing import Tracer, adispatch_cache_hit
+
 # --- Configurações ---
-app = FastAPI(title="Supervisor Agent (Intelligent)")
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 RESEARCHER_URL = os.getenv("RESEARCHER_URL", "http://researcher-service:8001")
 WRITER_URL = os.getenv("WRITER_URL", "http://writer-agent:8002")
+MEDIA_QUEUE_MAXLEN = int(os.getenv("MEDIA_QUEUE_MAXLEN", "100000"))
+# Spans de cada workflow (JSON lines); vazio desliga a gravação em arquivo
+TRACE_PATH = os.getenv("SUPERVISOR_TRACE_PATH", "traces.jsonl")
+# "react": o LLM decide cada passo; "pipeline": research -> write -> publish fixo, LLM só se um passo falhar
+SUPERVISOR_MODE = os.getenv("SUPERVISOR_MODE", "react")
+# Pesquisa especulativa: a busca pelo tópico começa junto com a primeira chamada ao LLM
+SPECULATIVE_RESEARCH = os.getenv("SUPERVISOR_SPECULATIVE_RESEARCH", "0") == "1"
+# Similaridade mínima (Jaccard das palavras) entre a query do LLM e o tópico para reaproveitar a busca
+SPECULATIVE_SIMILARITY = float(os.getenv("SUPERVISOR_SPECULATIVE_SIMILARITY", "0.6"))
+
+# Pool HTTP compartilhado por todas as tools e workflows (aberto/fechado no lifespan)
+http_pool = HttpPool(
+    http2=os.getenv("SUPERVISOR_HTTP2", "1") == "1",
+    max_connections=int(os.getenv("SUPERVISOR_MAX_CONNECTIONS", "100")),
+)
+# Timeouts por serviço: conectar tem que ser rápido; a leitura depende do que o serviço faz
+researcher = ServiceClient(
+    "researcher",
+    RESEARCHER_URL,
+    http_pool,
+    timeout=httpx.Timeout(float(os.getenv("RESEARCHER_TIMEOUT", "30")), connect=2.0),
+    retries=int(os.getenv("RESEARCHER_RETRIES", "2")),
+    breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30.0),
+)
+writer = ServiceClient(
+    "writer",
+    WRITER_URL,
+    http_pool,
+    timeout=httpx.Timeout(float(os.getenv("WRITER_TIMEOUT", "60")), connect=2.0),
+    retries=int(os.getenv("WRITER_RETRIES", "1")),
+    breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60.0),
+)
 
-# Setup Redis
+# Setup Redis (cliente asyncio: publicar na fila não bloqueia o event loop)
 try:
-    r_client = redis.from_url(REDIS_URL)
+    r_client = aioredis.from_url(REDIS_URL)
 except Exception as e:
     print(f"Warning: Redis connection failed: {e}")
     r_client = None
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_pool.start()
+    jobs.start()
+    yield
+    await jobs.stop()
+    await http_pool.close()
+    if r_client:
+        await r_client.close()
+
+app = FastAPI(title="Supervisor Agent (Intelligent)", lifespan=lifespan)
+
 # --- Ferramentas (Tools) que o Supervisor pode usar ---
 
+# Busca especulativa do workflow atual: (tópico, task em andamento), definida por run_workflow
+speculative_research: ContextVar[Optional[Tuple[str, "asyncio.Task"]]] = ContextVar("speculative_research", default=None)
+
+
+async def search_researcher(query: str) -> str:
+    async with stage("researcher"):
+        res = await researcher.post("/search", json={"text": query})
+    return res.json().get("results", "No results found.")
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _query_matches(query: str, topic: str) -> bool:
+    # O LLM quase sempre pesquisa o próprio tópico, às vezes com palavras a mais
+    query_words, topic_words = _words(query), _words(topic)
+    if not query_words or not topic_words:
+        return False
+    return len(query_words & topic_words) / len(query_words | topic_words) >= SPECULATIVE_SIMILARITY
+
+
+async def _speculative_result(query: str, callbacks: Callbacks) -> Optional[str]:
+    speculative = speculative_research.get()
+    if speculative is None or not _query_matches(query, speculative[0]):
+        return None
+    try:
+        data = await asyncio.shield(speculative[1])
+    except Exception as e:
+        # A busca antecipada falhou: a tool faz a chamada normal
+        print(f"[Tool] Speculative research failed ({e}); calling Researcher again", flush=True)
+        return None
+    print(f"[Tool] Reusing speculative research for topic: {speculative[0]}", flush=True)
+    await adispatch_cache_hit("speculative", callbacks)
+    return data
+
+
+# `callbacks` é injetado pelo LangChain (fica fora do schema da tool) e aponta para o run da
+# própria tool: os cache hits marcam o span tool:<nome> no Tracer
 @tool
-async def call_researcher_agent(query: str) -> str:
+async def call_researcher_agent(query: str, callbacks: Callbacks = None) -> str:
     """
     Use this tool to research information about a topic.
     It calls the Researcher Agent and returns the context found.
     """
     print(f"[Tool] Calling Researcher with query: {query}", flush=True)
-    async with httpx.AsyncClient() as client:
-        try:
-            res = await client.post(f"{RESEARCHER_URL}/search", json={"text": query}, timeout=30.0)
-            res.raise_for_status()
-            data = res.json().get("results", "No results found.")
-            # Log parcial para não poluir
-            print(f"[Tool] Researcher returned: {str(data)[:100]}...", flush=True) 
-            return data
-        except Exception as e:
-            return f"Error calling researcher: {e}"
+    try:
+        data = await _speculative_result(query, callbacks)
+        if data is None:
+            data = await search_researcher(query)
+        # Log parcial para não poluir
+        print(f"[Tool] Researcher returned: {str(data)[:100]}...", flush=True) 
+        return data
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        return f"Error calling researcher: {e}"
 
 @tool
-async def call_writer_agent(topic: str, context: str) -> str:
+async def call_writer_agent(topic: str, context: str, callbacks: Callbacks = None) -> str:
     """
     Use this tool to write the final content/article.
     You MUST provide the original topic and the context gathered from research.
     """
     print(f"[Tool] Calling Writer for topic: {topic}", flush=True)
-    async with httpx.AsyncClient() as client:
-        try:
-            payload = {"topic": topic, "context": context}
-            res = await client.post(f"{WRITER_URL}/write", json=payload, timeout=60.0)
-            res.raise_for_status()
-            return res.json().get("content", "Error generating content.")
-        except Exception as e:
-            return f"Error calling writer: {e}"
+    try:
+        # O Writer responde em SSE: cada token é repassado na hora para /jobs/{id}/stream
+        payload = {"topic": topic, "context": context, "stream": True}
+        content, error = None, None
+        async with stage("writer"):
+            async for event in writer.stream_events("/write", payload):
+                if event["type"] == "token":
+                    emit({"type": "token", "source": "writer", "token": event["token"]})
+                elif event["type"] == "done":
+                    content = event["content"]
+                    if event.get("cache"):
+                        # Marca o span desta tool como servido pelo cache do Writer
+                        await adispatch_cache_hit(event["cache"], callbacks)
+                elif event["type"] == "error":
+                    error = event["error"]
+        if error:
+            return f"Error generating text: {error}"
+        return content or "Error generating content."
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        return f"Error calling writer: {e}"
 
 @tool
-def publish_to_worker(topic: str, final_content: str) -> str:
+async def publish_to_worker(topic: str, final_content: str) -> str:
     """
     Use this tool ONLY when the content is ready and finalized.
     It sends the work to the processing queue.
     """
     print(f"[Tool] Dispatching to Worker...", flush=True)
     if r_client:
+        job = current_job.get()
         task = {
             "task": "publish_content",
-            "data": {"topic": topic, "content": final_content}
+            "data": {"topic": topic, "content": final_content},
+            # O worker usa enqueued_at para medir a espera na fila; trace_id liga a task ao job
+            "enqueued_at": time.time(),
+            "trace_id": job.id if job else uuid.uuid4().hex,
         }
-        r_client.rpush("media_queue", json.dumps(task))
+        try:
+            # Redis Stream consumido por consumer group (ver workers/queue_runtime.py). O worker
+            # apaga cada mensagem depois do XACK, então o XLEN é o backlog real; sem MAXLEN, que
+            # cortaria as mais antigas mesmo sem processar: com a fila cheia, a task é recusada
+            async with stage("publish"):
+                backlog = await r_client.xlen("media_queue")
+                if backlog >= MEDIA_QUEUE_MAXLEN:
+                    print(f"[Tool] media_queue cheia ({backlog} tasks); publicação recusada", flush=True)
+                    return f"Worker queue is full ({backlog} pending tasks); try publishing again later."
+                await r_client.xadd("media_queue", {"payload": json.dumps(task)})
+        except RedisError as e:
+            return f"Failed to dispatch to worker queue: {e}"
         return "Successfully dispatched to worker queue."
     return "Failed to connect to Redis queue."
 
@@ -97,7 +220,8 @@ tools = [call_researcher_agent, call_writer_agent, publish_to_worker]
 
 # --- Configuração do Modelo (O Cérebro do Supervisor) ---
 # O Supervisor precisa de uma LLM para decidir qual ferramenta usar
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0) # ou gpt-3.5-turbo
+# stream_usage: com streaming, a contagem de tokens só vem se pedida (usada pelo Tracer)
+llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, stream_usage=True) # ou gpt-3.5-turbo
 # Nota: create_react_agent faz o bind_tools automaticamente, não precisamos fazer aqui manualmente
 
 
@@ -129,27 +253,216 @@ DO NOT loop or search repeatedly. Proceed to writing immediately after the first
 # Nota: O parâmetro correto nesta versão é 'prompt'.
 app_graph = create_react_agent(llm, tools, prompt=system_prompt)
 
+# --- Modo pipeline (sem planejamento pelo LLM) ---
+
+# O processo do system_prompt é fixo, então o modo pipeline executa as mesmas tools em
+# sequência, sem uma ida ao LLM por passo. Se um passo falhar, o grafo ReAct assume dali.
+
+class PipelineState(TypedDict):
+    topic: str
+    context: str
+    content: str
+    failed_step: Optional[str]
+    error: str
+    messages: Annotated[list, add_messages]
+    response: str
+
+
+def _tool_failed(result) -> bool:
+    # As tools não levantam exceção: devolvem a mensagem de erro para o LLM ler
+    return isinstance(result, str) and result.startswith(("Error", "Failed"))
+
+
+async def research_step(state: PipelineState, config: RunnableConfig):
+    context = await call_researcher_agent.ainvoke({"query": state["topic"]}, config)
+    if _tool_failed(context):
+        return {"failed_step": "research", "error": context}
+    return {"context": context}
+
+
+async def write_step(state: PipelineState, config: RunnableConfig):
+    content = await call_writer_agent.ainvoke({"topic": state["topic"], "context": state["context"]}, config)
+    if _tool_failed(content):
+        return {"failed_step": "write", "error": content}
+    return {"content": content}
+
+
+async def publish_step(state: PipelineState, config: RunnableConfig):
+    result = await publish_to_worker.ainvoke({"topic": state["topic"], "final_content": state["content"]}, config)
+    if _tool_failed(result):
+        return {"failed_step": "publish", "error": result}
+    return {"response": f"The content about '{state['topic']}' was researched, written and published to the worker queue."}
+
+
+async def planner_fallback(state: PipelineState, config: RunnableConfig):
+    # O LLM recebe o que já foi feito e o erro, e decide como continuar (tentar de novo, pular...)
+    done = []
+    if state.get("context"):
+        done.append(f"Research is already done. Context found:\n{state['context']}")
+    if state.get("content"):
+        done.append(f"The article is already written:\n{state['content']}")
+    note = "\n\n".join(done + [f"The '{state['failed_step']}' step failed with: {state['error']}. Continue from there."])
+    logger.info(f"[Pipeline] Passo '{state['failed_step']}' falhou; delegando ao planejador LLM")
+    messages = [HumanMessage(content=f"Please produce content about {state['topic']}\n\n{note}")]
+    final = await app_graph.ainvoke({"messages": messages}, config)
+    return {"messages": final["messages"], "response": final["messages"][-1].content}
+
+
+def _next_or_fallback(next_step: str):
+    def route(state: PipelineState) -> str:
+        return "planner" if state.get("failed_step") else next_step
+    return route
+
+
+pipeline = StateGraph(PipelineState)
+pipeline.add_node("research", research_step)
+pipeline.add_node("write", write_step)
+pipeline.add_node("publish", publish_step)
+pipeline.add_node("planner", planner_fallback)
+pipeline.set_entry_point("research")
+pipeline.add_conditional_edges("research", _next_or_fallback("write"), ["write", "planner"])
+pipeline.add_conditional_edges("write", _next_or_fallback("publish"), ["publish", "planner"])
+pipeline.add_conditional_edges("publish", _next_or_fallback(END), [END, "planner"])
+pipeline.add_edge("planner", END)
+pipeline_graph = pipeline.compile()
+
 # --- API Endpoints ---
 
-@app.post("/run")
-async def run_workflow(topic: str):
-    logger.info(f"--- Iniciando Workflow para: {topic} ---")
+async def run_workflow(topic: str, mode: Optional[str] = None, speculative: Optional[bool] = None):
+    mode = mode or SUPERVISOR_MODE
+    speculative = SPECULATIVE_RESEARCH if speculative is None else speculative
+    logger.info(f"--- Iniciando Workflow ({mode}) para: {topic} ---")
+
+    # No modo react, a busca pelo tópico já sai enquanto o LLM decide o primeiro passo; a tool
+    # reaproveita o resultado se a query do LLM bater com o tópico. No pipeline a pesquisa
+    # já é o primeiro passo, então não há o que antecipar.
+    prefetch = None
+    if speculative and mode != "pipeline":
+        prefetch = asyncio.create_task(search_researcher(topic))
+        # Reset no fim: a task do JobManager roda vários workflows em sequência
+        speculative_token = speculative_research.set((topic, prefetch))
     
-    initial_state = {
-        "messages": [HumanMessage(content=f"Please produce content about {topic}")]
-    }
+    if mode == "pipeline":
+        graph, initial_state = pipeline_graph, {"topic": topic}
+    else:
+        graph, initial_state = app_graph, {
+            "messages": [HumanMessage(content=f"Please produce content about {topic}")]
+        }
     
-    # Executa o grafo e pega o último estado
-    final_state = await app_graph.ainvoke(initial_state)
+    # Executa o grafo via stream de eventos do LangGraph: tokens do Supervisor e início/fim
+    # das tools vão para /jobs/{id}/stream enquanto o workflow roda
+    # Um span por nó, chamada de LLM e tool; o relatório fica em /jobs/{id}/trace
+    job = current_job.get()
+    tracer = Tracer(trace_id=job.id if job else None, path=TRACE_PATH or None)
+
+    final_state = None
+    try:
+        async for event in graph.astream_events(initial_state, config={"callbacks": [tracer]}, version="v2"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                token = event["data"]["chunk"].content
+                if token:
+                    emit({"type": "token", "source": "supervisor", "token": token})
+            elif kind in ("on_tool_start", "on_tool_end"):
+                emit({"type": kind[3:], "tool": event["name"]})
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                # Fim do grafo (o evento raiz não tem pais): a saída é o estado final
+                final_state = event["data"]["output"]
+    finally:
+        if prefetch is not None:
+            # Não usada (o LLM pesquisou outra coisa) ou o workflow falhou antes
+            prefetch.cancel()
+            await asyncio.gather(prefetch, return_exceptions=True)
+            speculative_research.reset(speculative_token)
+        # Também em falha: o trace mostra até onde o workflow chegou
+        if job:
+            job.trace = tracer.report()
+        logger.info(tracer.format_report())
     
-    # Pega a última mensagem do assistente
-    last_msg = final_state["messages"][-1].content
+    # Pega a última mensagem do assistente (no pipeline, o resumo do passo final ou do fallback)
+    last_msg = final_state["response"] if mode == "pipeline" else final_state["messages"][-1].content
     
     return {
         "status": "completed",
+        "mode": mode,
         "supervisor_response": last_msg
     }
 
+# Workflows rodam em segundo plano, no máximo SUPERVISOR_MAX_CONCURRENCY ao mesmo tempo;
+# com a fila cheia (SUPERVISOR_MAX_QUEUE), /run responde 429
+jobs = JobManager(
+    run_workflow,
+    max_concurrency=int(os.getenv("SUPERVISOR_MAX_CONCURRENCY", "4")),
+    max_queue_depth=int(os.getenv("SUPERVISOR_MAX_QUEUE", "32")),
+)
+
+@app.post("/run", status_code=202)
+async def submit_workflow(
+    topic: str,
+    response: Response,
+    mode: Optional[Literal["react", "pipeline"]] = None,
+    speculative: Optional[bool] = None,
+):
+    try:
+        job = jobs.submit(topic, mode=mode, speculative=speculative)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Supervisor busy: {e}", headers={"Retry-After": "5"})
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/jobs/stats")
+def jobs_stats():
+    # Tempo na fila vs. tempo de execução (total e por etapa), p50/p95
+    return jobs.stats()
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/trace")
+def job_trace(job_id: str):
+    # Tempo, tokens e cache hits por nó/LLM/tool, do que mais pesa para o que menos pesa
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.trace is None:
+        raise HTTPException(status_code=404, detail="Trace not available yet")
+    return job.trace
+
+@app.get("/jobs/{job_id}/stream")
+async def job_stream(job_id: str):
+    # Server-sent events: repete o que o job já emitiu e segue até o evento "done"
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for event in job.follow():
+            yield f"data: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str, response: Response):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "completed":
+        # Ainda na fila ou rodando: o cliente tenta de novo depois
+        response.status_code = 202
+        return {"job_id": job.id, "status": job.status}
+    return {"job_id": job.id, **job.result}
+
+@app.get("/services/stats")
+def services_stats():
+    # Estado do circuit breaker de cada serviço chamado pelas tools
+    return {client.name: client.stats() for client in (researcher, writer)}
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
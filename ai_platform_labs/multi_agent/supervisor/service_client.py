@@ -0,0 +1,196 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+# Status que valem nova tentativa: o serviço está sobrecarregado ou reiniciando
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Abre depois de `failure_threshold` falhas seguidas: enquanto aberto, as chamadas falham
+    na hora, sem ocupar conexão nem esperar timeout de um serviço fora do ar. Passados
+    `reset_timeout` segundos, deixa uma chamada de teste passar (meio-aberto); se ela der
+    certo, fecha de novo.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        # Roda só no event loop, então não precisa de lock
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # Fim da chamada de teste, chamado sempre (finally): se ela não contou como sucesso
+        # nem falha (cancelada, 4xx, stream fechado antes do fim), libera a vaga de teste
+        # para a próxima chamada em vez de deixar o breaker aberto para sempre
+        self._probing = False
+
+
+class HttpPool:
+    """
+    Um único httpx.AsyncClient para todo o processo: as conexões (e o handshake TLS) são
+    reaproveitadas entre chamadas e workflows. Criado no lifespan, dentro do loop do servidor.
+    """
+
+    def __init__(self, http2: bool = True, max_connections: int = 100, max_keepalive_connections: int = 20):
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive_connections
+        )
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        # HTTP/2 é negociado via TLS (ALPN); em http:// simples o httpx segue em HTTP/1.1 keep-alive
+        self.client = httpx.AsyncClient(http2=self.http2, limits=self.limits)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+class ServiceClient:
+    """
+    Chamadas a um serviço interno pelo pool compartilhado, com timeout próprio, novas
+    tentativas com backoff exponencial e jitter, e um circuit breaker por serviço.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        pool: HttpPool,
+        timeout: httpx.Timeout,
+        retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.pool = pool
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": espalha as novas tentativas de vários workflows no tempo
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def post(self, path: str, json: Dict[str, Any]) -> httpx.Response:
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            return await self._post(path, json)
+        finally:
+            if probe:
+                self.breaker.release()
+
+    async def _post(self, path: str, json: Dict[str, Any]) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.pool.client.post(f"{self.base_url}{path}", json=json, timeout=self.timeout)
+                if response.status_code not in RETRYABLE_STATUS:
+                    # 4xx é erro de quem chamou, não do serviço: não conta para o breaker
+                    if response.status_code < 400:
+                        self.breaker.record_success()
+                    elif response.status_code >= 500:
+                        self.breaker.record_failure()
+                    response.raise_for_status()
+                    return response
+                error: Exception = httpx.HTTPStatusError(
+                    f"{self.name} returned {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt == self.retries:
+                self.breaker.record_failure()
+                raise error
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def stream_events(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        # Server-sent events (uma linha "data: {json}" por evento). Só a conexão é
+        # re-tentada: depois do primeiro evento, uma falha interrompe o stream.
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        events = self._stream_events(path, payload)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            # Fecha a resposta mesmo se quem consome parar no meio do stream
+            await events.aclose()
+            if probe:
+                self.breaker.release()
+
+    async def _stream_events(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        received = False
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.pool.client.stream(
+                    "POST", f"{self.base_url}{path}", json=payload, timeout=self.timeout
+                ) as response:
+                    if response.status_code in RETRYABLE_STATUS and attempt < self.retries:
+                        await asyncio.sleep(self._backoff(attempt))
+                        continue
+                    if response.status_code >= 500:
+                        self.breaker.record_failure()
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if line.startswith("data:"):
+                            received = True
+                            yield json.loads(line[len("data:"):])
+                self.breaker.record_success()
+                return
+            except httpx.TransportError:
+                if received or attempt == self.retries:
+                    self.breaker.record_failure()
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.breaker.state, "consecutive_failures": self.breaker.failures}
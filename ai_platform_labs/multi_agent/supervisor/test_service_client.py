@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+import pytest
+
+from service_client import CircuitBreaker, CircuitOpenError, HttpPool, ServiceClient
+
+
+def make_client(handler) -> ServiceClient:
+    pool = HttpPool(http2=False)
+    pool.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    # reset_timeout=0: o breaker aberto já está meio-aberto na próxima chamada
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return ServiceClient("svc", "http://svc", pool, httpx.Timeout(5.0), retries=0, breaker=breaker)
+
+
+def test_cancelled_probe_releases_half_open_breaker():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(request):
+            if request.url.path == "/slow":
+                await release.wait()
+            return httpx.Response(200, json={"ok": True})
+
+        client = make_client(handler)
+        probe = asyncio.ensure_future(client.post("/slow", json={}))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitOpenError):
+            await client.post("/fast", json={})
+
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        response = await client.post("/fast", json={})
+        return response, client.breaker.state
+
+    response, state = asyncio.run(scenario())
+    assert response.json() == {"ok": True}
+    assert state == "closed"
+
+
+def test_client_error_and_early_close_release_probe():
+    async def scenario():
+        async def handler(request):
+            if request.url.path == "/missing":
+                return httpx.Response(404)
+            return httpx.Response(200, text="data: {\"n\": 1}\n\ndata: {\"n\": 2}\n\n")
+
+        client = make_client(handler)
+        with pytest.raises(httpx.HTTPStatusError):
+            async for _ in client.stream_events("/missing", {}):
+                pass
+        assert client.breaker.state == "half_open"
+
+        events = client.stream_events("/events", {})
+        assert await events.__anext__() == {"n": 1}
+        await events.aclose()
+
+        states = [client.breaker.state]
+        async for _ in client.stream_events("/events", {}):
+            pass
+        return states + [client.breaker.state]
+
+    assert asyncio.run(scenario()) == ["half_open", "closed"]
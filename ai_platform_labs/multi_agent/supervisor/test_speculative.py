@@ -0,0 +1,56 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("fastapi")
+
+# main cria o ChatOpenAI no import; nenhuma chamada ao LLM é feita aqui
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import main
+from tracing import Tracer
+
+
+def run_researcher_tool(monkeypatch, topic: str, query: str):
+    calls = []
+
+    async def fake_search(text: str) -> str:
+        calls.append(text)
+        return f"context for {text}"
+
+    monkeypatch.setattr(main, "search_researcher", fake_search)
+
+    async def scenario():
+        prefetch = asyncio.ensure_future(fake_search(topic))
+        token = main.speculative_research.set((topic, prefetch))
+        tracer = Tracer()
+        try:
+            result = await main.call_researcher_agent.ainvoke({"query": query}, config={"callbacks": [tracer]})
+        finally:
+            main.speculative_research.reset(token)
+        return result, tracer
+
+    result, tracer = asyncio.run(scenario())
+    return result, calls, tracer
+
+
+def test_matching_query_reuses_prefetch_and_marks_tool_span(monkeypatch):
+    result, calls, tracer = run_researcher_tool(monkeypatch, "LangGraph agents", "langgraph agents")
+
+    assert result == "context for LangGraph agents"
+    assert calls == ["LangGraph agents"]
+    (span,) = [s for s in tracer.spans if s["kind"] == "tool"]
+    assert span["name"] == "call_researcher_agent"
+    assert span["cache_hit"] is True
+    assert span["cache_tier"] == "speculative"
+    assert tracer.report()["steps"]["tool:call_researcher_agent"]["cache_hits"] == 1
+
+
+def test_different_query_calls_researcher_again(monkeypatch):
+    result, calls, tracer = run_researcher_tool(monkeypatch, "LangGraph agents", "vector database pricing")
+
+    assert result == "context for vector database pricing"
+    assert calls == ["LangGraph agents", "vector database pricing"]
+    assert tracer.report()["steps"]["tool:call_researcher_agent"]["cache_hits"] == 0
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Optional
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, Callbacks
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import BaseTool, tool
+from langgraph.graph import MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode, tools_condition
+
+from tracing import Tracer, adispatch_cache_hit
+
+
+# Os dois jeitos de disparar o hit usados no repositório: @tool com `callbacks`
+# (Supervisor) e BaseTool com `run_manager` (StartupSearchTool)
+@tool
+async def cached_search(query: str, callbacks: Callbacks = None) -> str:
+    """Search that always hits the cache."""
+    await adispatch_cache_hit("speculative", callbacks)
+    return f"cached result for {query}"
+
+
+class MemoTool(BaseTool):
+    name: str = "memo_search"
+    description: str = "Search that always hits the memo."
+
+    def _run(self, query: str) -> str:
+        raise NotImplementedError
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
+        await adispatch_cache_hit("memo", run_manager.get_child())
+        return f"memo result for {query}"
+
+
+def build_graph():
+    tools = [cached_search, MemoTool()]
+
+    def agent(state: MessagesState):
+        # Primeira rodada: duas tool calls em paralelo; depois responde direto
+        if len(state["messages"]) > 1:
+            return {"messages": [AIMessage(content="done")]}
+        return {"messages": [AIMessage(content="", tool_calls=[
+            {"name": "cached_search", "args": {"query": "restart"}, "id": "call_1"},
+            {"name": "memo_search", "args": {"query": "restart"}, "id": "call_2"},
+        ])]}
+
+    workflow = StateGraph(MessagesState)
+    workflow.add_node("agent", agent)
+    workflow.add_node("tools", ToolNode(tools))
+    workflow.set_entry_point("agent")
+    workflow.add_conditional_edges("agent", tools_condition)
+    workflow.add_edge("tools", "agent")
+    return workflow.compile()
+
+
+def test_cache_hits_are_attributed_to_tool_spans(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "traces.jsonl"))
+    asyncio.run(build_graph().ainvoke({"messages": [HumanMessage(content="hi")]}, config={"callbacks": [tracer]}))
+
+    steps = tracer.report()["steps"]
+    assert steps["tool:cached_search"]["cache_hits"] == 1
+    assert steps["tool:memo_search"]["cache_hits"] == 1
+    assert steps["node:tools"]["cache_hits"] == 0
+
+    tiers = {s["name"]: s.get("cache_tier") for s in tracer.spans if s["kind"] == "tool"}
+    assert tiers == {"cached_search": "speculative", "memo_search": "memo"}
+    assert len((tmp_path / "traces.jsonl").read_text().splitlines()) == len(tracer.spans)
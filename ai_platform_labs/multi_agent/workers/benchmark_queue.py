@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from queue_runtime import StreamWorker
+
+# Mede a vazão sustentada do StreamWorker: enfileira N tarefas e cronometra até a última ser confirmada.
+# Sem --redis-url usa o fakeredis (pip install fakeredis), que dá ordem de grandeza, não o número de produção.
+# Uso: python benchmark_queue.py --tasks 5000 --concurrency 8 [--redis-url redis://localhost:6379/0]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def benchmark(tasks, concurrency, batch_size, task_ms, redis_url=None):
+    if redis_url:
+        import redis.asyncio as aioredis
+        r = aioredis.from_url(redis_url, decode_responses=True)
+    else:
+        from fakeredis.aioredis import FakeRedis
+        r = FakeRedis(decode_responses=True)
+
+    # Stream próprio por execução para não misturar com a media_queue de verdade
+    stream = f"benchmark_queue:{uuid.uuid4().hex[:8]}"
+    waits = []
+
+    async def handler(task):
+        waits.append(time.time() - task["enqueued_at"])
+        if task_ms:
+            await asyncio.sleep(task_ms / 1000)
+        if len(waits) == tasks:
+            worker.stop()
+
+    worker = StreamWorker(
+        r, stream, handler,
+        group="benchmark", concurrency=concurrency, batch_size=batch_size, visibility_timeout=600, block_ms=100,
+    )
+    await worker.ensure_group()
+
+    enqueue_start = time.perf_counter()
+    pipe = r.pipeline(transaction=False)
+    for i in range(tasks):
+        task = {"task": "benchmark", "data": {"i": i}, "enqueued_at": time.time(), "trace_id": uuid.uuid4().hex}
+        pipe.xadd(stream, {"payload": json.dumps(task)})
+    await pipe.execute()
+    enqueue_seconds = time.perf_counter() - enqueue_start
+
+    start = time.perf_counter()
+    await worker.run()
+    elapsed = time.perf_counter() - start
+
+    await r.delete(stream)
+    await r.close()
+
+    print(f"\n--- Benchmark media_queue ({'redis' if redis_url else 'fakeredis'}) ---")
+    print(f"Tarefas: {len(waits)} | concurrency={concurrency} batch_size={batch_size} task_ms={task_ms}")
+    print(f"Enfileiramento: {tasks / enqueue_seconds:.0f} tasks/s")
+    print(f"Processamento:  {len(waits) / elapsed:.0f} tasks/s ({elapsed:.2f} s)")
+    print(f"Espera na fila: p50={percentile(waits, 0.50) * 1000:.1f} ms  p95={percentile(waits, 0.95) * 1000:.1f} ms  "
+          f"média={statistics.mean(waits) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--task-ms", type=float, default=0, help="Trabalho simulado por tarefa")
+    parser.add_argument("--redis-url", default=None, help="Sem isso, usa fakeredis em memória")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.tasks, args.concurrency, args.batch_size, args.task_ms, args.redis_url))
@@ -1,37 +1,57 @@
-import redis
-import time
-import json
-
+import asyncio
 import sys
 import os
 
+import redis.asyncio as aioredis
+
+from metrics import serve_metrics
+from queue_runtime import StreamWorker
+
 # Forçar stdout a não usar buffer para aparecer nos logs do Docker imediatamente
 sys.stdout.reconfigure(line_buffering=True)
 
-r = redis.from_url("redis://redis:6379/0")
-
-def worker_loop(queue_name):
-    print(f"[*] Worker iniciado na fila: {queue_name}")
-    while True:
-        # Bloqueia até chegar uma mensagem
-        _, message = r.blpop(queue_name)
-        task = json.loads(message)
-        
-        task_name = task.get('task')
-        data = task.get('data', {})
-        
-        print(f"[Worker] Processando {task_name}...", flush=True)
-        
-        if task_name == 'publish_content':
-            topic = data.get('topic', 'N/A')
-            content = data.get('content', 'No Content')
-            print(f"\n========== [Worker] PUBLISHING CONTENT ({topic}) ==========", flush=True)
-            print(content, flush=True)
-            print("===========================================================\n", flush=True)
-        
-        time.sleep(2) # Simula tarefa pesada
-        print(f"[Worker] {task_name} concluído com sucesso!", flush=True)
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+TASK_SECONDS = float(os.getenv("WORKER_TASK_SECONDS", "2"))
+
+async def handle_task(task):
+    task_name = task.get('task')
+    data = task.get('data', {})
+
+    print(f"[Worker] Processando {task_name} (trace {task.get('trace_id', 'N/A')})...", flush=True)
+
+    if task_name == 'publish_content':
+        topic = data.get('topic', 'N/A')
+        content = data.get('content', 'No Content')
+        print(f"\n========== [Worker] PUBLISHING CONTENT ({topic}) ==========", flush=True)
+        print(content, flush=True)
+        print("===========================================================\n", flush=True)
+
+    await asyncio.sleep(TASK_SECONDS) # Simula tarefa pesada (sem travar os outros workers)
+    print(f"[Worker] {task_name} concluído com sucesso!", flush=True)
+
+async def worker_loop(queue_name):
+    # Conexão criada aqui (não no import), com a URL do ambiente
+    r = aioredis.from_url(REDIS_URL, decode_responses=True)
+    worker = StreamWorker(
+        r,
+        queue_name,
+        handle_task,
+        concurrency=int(os.getenv("WORKER_CONCURRENCY", "8")),
+        batch_size=int(os.getenv("WORKER_BATCH_SIZE", "16")),
+        visibility_timeout=float(os.getenv("WORKER_VISIBILITY_TIMEOUT", "60")),
+        max_deliveries=int(os.getenv("WORKER_MAX_DELIVERIES", "5")),
+    )
+    metrics_port = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+    # Grupo (e stream) criados antes do servidor de métricas, que consulta XINFO GROUPS
+    await worker.ensure_group()
+    server = await serve_metrics(worker.render_metrics, metrics_port)
+    print(f"[*] Worker {worker.consumer} iniciado na fila: {queue_name} ({worker.concurrency} workers)")
+    print(f"[*] Métricas em http://0.0.0.0:{metrics_port}/metrics")
+    try:
+        await worker.run()
+    finally:
+        server.close()
+        await r.close()
 
 if __name__ == "__main__":
-    import sys
-    worker_loop(sys.argv[1])
\ No newline at end of file
+    asyncio.run(worker_loop(sys.argv[1] if len(sys.argv) > 1 else "media_queue"))
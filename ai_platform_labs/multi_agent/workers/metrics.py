@@ -0,0 +1,105 @@
+import asyncio
+import bisect
+from typing import Callable, Awaitable, Dict, List, Sequence
+
+# Buckets (segundos) de espera na fila e de processamento
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Dict[str, str]):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter",
+            f"{self.name}{{{_labels(self.labels)}}} {self.value}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Dict[str, str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> List[str]:
+        labels = _labels(self.labels)
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{self.name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class WorkerMetrics:
+    """Métricas do worker no formato texto do Prometheus (sem dependência extra)."""
+
+    def __init__(self, queue: str):
+        labels = {"queue": queue}
+        self.wait = Histogram("worker_queue_wait_seconds", "Time between enqueue and processing start", labels)
+        self.processing = Histogram("worker_processing_seconds", "Handler execution time", labels)
+        self.processed = Counter("worker_tasks_processed_total", "Tasks processed and acked", labels)
+        self.failed = Counter("worker_tasks_failed_total", "Handler failures (task left pending)", labels)
+        self.redelivered = Counter("worker_tasks_redelivered_total", "Tasks reclaimed after the visibility timeout", labels)
+        self.dead_lettered = Counter("worker_tasks_dead_lettered_total", "Tasks moved to the dead-letter queue", labels)
+        self.labels = labels
+
+    def gauge(self, name: str, help_text: str, value: float) -> List[str]:
+        return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name}{{{_labels(self.labels)}}} {value}"]
+
+    def render(self, gauges: Sequence[List[str]] = ()) -> str:
+        lines: List[str] = []
+        for metric in (self.wait, self.processing, self.processed, self.failed, self.redelivered, self.dead_lettered):
+            lines.extend(metric.render())
+        for gauge in gauges:
+            lines.extend(gauge)
+        return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(render: Callable[[], Awaitable[str]], port: int) -> asyncio.AbstractServer:
+    # HTTP mínimo: só GET /metrics, que é o que o Prometheus precisa
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if request_line.split(b" ")[1:2] == [b"/metrics"]:
+                try:
+                    status, body = "200 OK", (await render()).encode()
+                except Exception as e:
+                    # Ex.: Redis fora do ar; o scrape falha com erro em vez de conexão derrubada
+                    status, body = "500 Internal Server Error", f"{e!r}\n".encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host="0.0.0.0", port=port)
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from redis.exceptions import RedisError, ResponseError
+
+from metrics import WorkerMetrics
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class StreamWorker:
+    """
+    Consome uma fila (Redis Stream) por um consumer group, com entrega "pelo menos uma vez":
+
+    - lê em lotes (XREADGROUP COUNT) e processa com `concurrency` tasks asyncio;
+    - só confirma (XACK) depois que o handler termina: se o processo cair, a mensagem
+      continua pendente no Redis; confirmada, é apagada do stream (XDEL);
+    - mensagens pendentes há mais de `visibility_timeout` segundos (worker caiu ou
+      travou) são reclamadas (XAUTOCLAIM) e processadas de novo;
+    - depois de `max_deliveries` entregas sem sucesso, vão para a fila `<stream>:dlq`;
+    - erros do Redis na leitura/reclamação são logados e re-tentados com backoff
+      (até `max_backoff` segundos), sem derrubar o loop;
+    - SIGTERM/SIGINT param a leitura e esperam o que já foi lido terminar.
+
+    O handler deve ser idempotente: uma mensagem pode ser processada mais de uma vez.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        stream: str,
+        handler: Handler,
+        group: str = "media_workers",
+        consumer: Optional[str] = None,
+        concurrency: int = 8,
+        batch_size: int = 16,
+        visibility_timeout: float = 60.0,
+        max_deliveries: int = 5,
+        drain_timeout: float = 30.0,
+        block_ms: int = 1000,
+        max_backoff: float = 30.0,
+    ):
+        self.redis = redis_client
+        self.stream = stream
+        self.handler = handler
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.visibility_timeout = visibility_timeout
+        self.max_deliveries = max_deliveries
+        self.drain_timeout = drain_timeout
+        self.block_ms = block_ms
+        self.max_backoff = max_backoff
+        self.dead_letter_stream = f"{stream}:dlq"
+        self.metrics = WorkerMetrics(stream)
+        self._last_errors: Dict[str, str] = {}
+        self.buffer: "asyncio.Queue[Tuple[str, Dict[str, str]]]" = None
+        self._stopping: asyncio.Event = None
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def run(self):
+        # Criados aqui para usarem o loop do asyncio.run (Python 3.9)
+        self.buffer = asyncio.Queue(maxsize=self.concurrency * 2)
+        self._stopping = asyncio.Event()
+        await self.ensure_group()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        fetcher = asyncio.create_task(self._fetch())
+        reclaimer = asyncio.create_task(self._reclaim())
+        workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+        await self._stopping.wait()
+        print(f"[Worker] Parando: drenando {self.buffer.qsize()} mensagens do buffer local...", flush=True)
+        fetcher.cancel()
+        reclaimer.cancel()
+        await asyncio.gather(fetcher, reclaimer, return_exceptions=True)
+        try:
+            await asyncio.wait_for(self.buffer.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            # Não confirmadas continuam pendentes no Redis e serão reentregues a outro worker
+            print("[Worker] Tempo de drenagem esgotado; mensagens pendentes serão reentregues.", flush=True)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        print("[Worker] Parado.", flush=True)
+
+    def stop(self):
+        self._stopping.set()
+
+    async def render_metrics(self) -> str:
+        # Profundidade da fila = mensagens ainda não lidas pelo grupo (lag) + pendentes sem ack
+        try:
+            groups = await self.redis.xinfo_groups(self.stream)
+        except ResponseError:
+            # Stream ainda não criado (o grupo é criado no run): fila vazia, métricas zeradas
+            groups = []
+        group = next((g for g in groups if g["name"] == self.group), {})
+        return self.metrics.render([
+            self.metrics.gauge("worker_queue_length", "Entries in the stream (acked entries are deleted)", await self.redis.xlen(self.stream)),
+            self.metrics.gauge("worker_queue_lag", "Entries not yet delivered to the group", group.get("lag") or 0),
+            self.metrics.gauge("worker_queue_pending", "Entries delivered but not acked", group.get("pending", 0)),
+            self.metrics.gauge("worker_buffered_tasks", "Tasks read by this process awaiting a worker", self.buffer.qsize() if self.buffer else 0),
+        ])
+
+    async def _fetch(self):
+        failures = 0
+        while True:
+            # Só lê o que cabe no buffer: mensagem parada aqui também conta para o visibility timeout
+            free = self.buffer.maxsize - self.buffer.qsize()
+            if free == 0:
+                await asyncio.sleep(0.01)
+                continue
+            try:
+                response = await self.redis.xreadgroup(
+                    self.group, self.consumer, {self.stream: ">"}, count=min(self.batch_size, free), block=self.block_ms
+                )
+            except RedisError as e:
+                failures += 1
+                await self._backoff("leitura", e, failures)
+                continue
+            failures = 0
+            for _, messages in response or []:
+                for message_id, fields in messages:
+                    await self.buffer.put((message_id, fields))
+
+    async def _reclaim(self):
+        min_idle_ms = int(self.visibility_timeout * 1000)
+        failures = 0
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 2)
+            start = "0-0"
+            try:
+                while True:
+                    result = await self.redis.xautoclaim(
+                        self.stream, self.group, self.consumer, min_idle_time=min_idle_ms, start_id=start, count=self.batch_size
+                    )
+                    start, messages = result[0], result[1]
+                    for message_id, fields in messages:
+                        if fields:
+                            await self._redeliver(message_id, fields)
+                    if start in ("0-0", b"0-0"):
+                        break
+            except RedisError as e:
+                # A próxima rodada recomeça do início; o que não foi reclamado continua pendente
+                failures += 1
+                await self._backoff("reclamação", e, failures)
+                continue
+            failures = 0
+
+    async def _backoff(self, step: str, error: Exception, failures: int):
+        delay = min(self.max_backoff, 0.5 * 2 ** (failures - 1))
+        print(f"[Worker] Erro do Redis na {step} ({error!r}); nova tentativa em {delay:.1f}s", flush=True)
+        await asyncio.sleep(delay)
+
+    async def _ack(self, message_id: str):
+        # XACK + XDEL: confirmada, a mensagem sai do stream, então o XLEN conta só o que falta
+        # processar e nada depende de MAXLEN (que apagaria também mensagens não confirmadas)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(self.stream, self.group, message_id)
+        pipe.xdel(self.stream, message_id)
+        await pipe.execute()
+
+    async def _redeliver(self, message_id: str, fields: Dict[str, str]):
+        pending = await self.redis.xpending_range(self.stream, self.group, min=message_id, max=message_id, count=1)
+        deliveries = pending[0]["times_delivered"] if pending else 1
+        if deliveries <= self.max_deliveries:
+            self.metrics.redelivered.inc()
+            print(f"[Worker] Reentregando {message_id} (entrega {deliveries})", flush=True)
+            await self.buffer.put((message_id, fields))
+            return
+
+        # Dead letter: guarda a mensagem original e o motivo, e tira da fila principal
+        await self.redis.xadd(self.dead_letter_stream, {
+            **fields,
+            "source_id": message_id,
+            "deliveries": deliveries,
+            "error": self._last_errors.pop(message_id, "unknown"),
+        })
+        await self._ack(message_id)
+        self.metrics.dead_lettered.inc()
+        print(f"[Worker] {message_id} enviado para {self.dead_letter_stream} após {deliveries} entregas", flush=True)
+
+    async def _work(self):
+        while True:
+            message_id, fields = await self.buffer.get()
+            start = time.perf_counter()
+            try:
+                task = json.loads(fields["payload"])
+                # enqueued_at é carimbado pelo produtor (publish_to_worker)
+                if "enqueued_at" in task:
+                    self.metrics.wait.observe(max(0.0, time.time() - task["enqueued_at"]))
+                await self.handler(task)
+            except Exception as e:
+                # Sem XACK: fica pendente e volta depois do visibility timeout
+                self._last_errors[message_id] = repr(e)
+                self.metrics.failed.inc()
+                print(f"[Worker] Falha em {message_id}: {e!r}", flush=True)
+            else:
+                await self._ack(message_id)
+                self._last_errors.pop(message_id, None)
+                self.metrics.processed.inc()
+            finally:
+                self.metrics.processing.observe(time.perf_counter() - start)
+                self.buffer.task_done()